@@ -2,9 +2,9 @@ from fastapi import HTTPException, Depends
 from sqlalchemy.orm import Session
 from datetime import datetime
 import asyncio
-from typing import List
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
-from whatsapp_bot.openai_client import OpenAIClient
+from whatsapp_bot.openai_client import get_openai_client
 from whatsapp_bot.database.schema import ChatRequest, ChatResponse, ChatInteraction as ChatInteractionModel
 from whatsapp_bot.database import get_db, db_manager, redis_cache
 from whatsapp_bot.mapper import map_db_interaction_to_api_interaction
@@ -18,13 +18,18 @@ logger = get_logger(__name__)
 
 LIMITS_EXCEEDED = "limits exceeded"
 
+def _sse_event(data: str, event: Optional[str] = None) -> str:
+    """Frame text as a server-sent event (one data line per text line)"""
+    lines = "".join(f"data: {line}\n" for line in data.split("\n"))
+    return f"event: {event}\n{lines}\n" if event else f"{lines}\n"
+
 class ChatController:
     """Controller for handling chat-related operations"""
     
     def __init__(self, prompts_dir: str):
         self.prompts_dir = prompts_dir
         self.config_manager = config_manager
-        self.openai_client = OpenAIClient(prompts_dir)
+        self.openai_client = get_openai_client(prompts_dir)
         self.conversation_service = ConversationSummarizationService(prompts_dir)
         self.anti_ban_service = AntiBanService(self.config_manager)
         self.language_service = LanguageDetectionService()
@@ -43,70 +48,23 @@ class ChatController:
         """
         try:
             user_phone = request.sender_phone
-            receiver_phone = request.receiver_phone
             user_message = request.message
             
             logger.info(f"Received message from {user_phone}: {user_message}")
             
-            # 1. Check if bot is enabled
-            if not self.config_manager.config.enabled:
-                return ChatResponse(response="Bot is currently disabled.")
-            
-            # 2. Check maintenance mode
-            if self.config_manager.config.maintenance_mode:
-                return ChatResponse(response=self.config_manager.config.maintenance_message)
-            
-            # 3. Check if number is allowed
-            if not self.config_manager.is_number_allowed(user_phone):
-                logger.warning(f"Access denied for {user_phone}")
-                return ChatResponse(response="")  # Silent rejection
-            
-            # 4. Handle admin commands
-            if self.config_manager.is_admin(user_phone):
-                admin_response = await self._handle_admin_commands(user_message)
-                if admin_response:
-                    return ChatResponse(response=admin_response)
-            
-            # 5. Check if user wants to opt out
-            if await self.anti_ban_service.handle_opt_out(user_phone, user_message):
-                return ChatResponse(response="You have been unsubscribed. Send any message to re-enable.")
-            
-            # 6. Check anti-ban rules
-            allow_message, reason = await self.anti_ban_service.should_allow_message(user_phone, db)
-            if not allow_message:
-                logger.warning(f"Message blocked for {user_phone}: {reason}")
-                return ChatResponse(response=LIMITS_EXCEEDED)
-            
-            # 7. Check for spam in user message
-            is_spam, spam_reason = await self.anti_ban_service.check_message_for_spam(user_message)
-            if is_spam:
-                logger.warning(f"Spam detected from {user_phone}: {spam_reason}")
-                return ChatResponse(response="I can help you with questions, but please avoid promotional content.")
-            
-            # 8. Add human-like delay BEFORE processing
-            delay = await self.anti_ban_service.get_human_like_delay()
-            logger.debug(f"Adding {delay:.2f}s delay before responding to {user_phone}")
-            await asyncio.sleep(delay)
+            # 1-8. Access control, admin commands, opt-out, anti-ban and spam checks
+            early_response = await self._check_message(request, db)
+            if early_response is not None:
+                return early_response
             
             # 9. Process message normally
-            user = db_manager.get_or_create_user(db, user_phone)
-            
-            # Get optimized conversation context with summarization
-            conversation_history, was_summarized = self.conversation_service.get_optimized_conversation_context(
-                db, user.id, user_message, receiver_phone
-            )
-            
-            if was_summarized:
-                logger.info(f"Used summarized conversation context for {user_phone}")
-            
-            # Detect language using the new language service
-            language = self.language_service.get_language_for_conversation(user_message, user.id)
+            conversation_history, language = await self._prepare_context(request, db)
             
             # 10. Get response configuration
             response_config = self.config_manager.get_response_config()
             
             # 11. Generate response with configured settings
-            response_message = self.openai_client.generate_response(
+            response_message = await self.openai_client.generate_response(
                 user_message=user_message,
                 language=language,
                 conversation_history=conversation_history,
@@ -122,19 +80,7 @@ class ChatController:
             logger.debug(f"Response: {response_message}")
             
             # 13. Save interaction
-            chat_response = ChatResponse(response=response_message)
-            db_manager.save_interaction(
-                db=db,
-                interaction=ChatInteractionModel(
-                    chat_request=request,
-                    chat_response=chat_response,
-                    timestamp=datetime.now(),
-                    language=language
-                )
-            )
-            
-            # 14. Record message sent for rate limiting
-            await self.anti_ban_service.record_message_sent(user_phone)
+            chat_response = await self._save_response(request, response_message, language, db)
             
             logger.info(f"Response sent to {user_phone}")
             return chat_response
@@ -144,6 +90,138 @@ class ChatController:
             # Return a human-like error message
             return ChatResponse(response="Sorry, I'm having trouble right now. Could you try again in a moment? 😅")
     
+    async def chat_stream_endpoint(self, request: ChatRequest, db: Session = Depends(get_db)) -> AsyncIterator[str]:
+        """
+        Handle a chat interaction, yielding the response as it is generated
+        
+        Runs the same checks as chat_endpoint. The stream is sanitized as it is sent,
+        and exactly the text delivered is saved. A failure is reported as a
+        separate "error" event, so clients can tell it apart from the reply text.
+        
+        Args:
+            request: Chat request containing phone and message
+            db: Database session
+            
+        Yields:
+            Server-sent events: response text chunks, then an "error" event on failure
+        """
+        try:
+            user_phone = request.sender_phone
+            user_message = request.message
+            
+            logger.info(f"Received streaming message from {user_phone}: {user_message}")
+            
+            early_response = await self._check_message(request, db)
+            if early_response is not None:
+                yield _sse_event(early_response.response)
+                return
+            
+            conversation_history, language = await self._prepare_context(request, db)
+            response_config = self.config_manager.get_response_config()
+            
+            stream = self.openai_client.generate_response_stream(
+                user_message=user_message,
+                language=language,
+                conversation_history=conversation_history,
+                temperature=response_config.temperature,
+                max_tokens=response_config.max_tokens,
+                response_style=response_config.response_style
+            )
+            
+            # Accumulate the sanitized chunks, so the saved reply is the one delivered
+            chunks = []
+            async for chunk in self.anti_ban_service.sanitize_stream(stream):
+                chunks.append(chunk)
+                yield _sse_event(chunk)
+            
+            await self._save_response(request, "".join(chunks), language, db)
+            
+            logger.info(f"Streamed response sent to {user_phone}")
+            
+        except Exception as e:
+            logger.error(f"Error in chat stream endpoint: {str(e)}")
+            yield _sse_event("Sorry, I'm having trouble right now. Could you try again in a moment? 😅", event="error")
+    
+    async def _check_message(self, request: ChatRequest, db: Session) -> Optional[ChatResponse]:
+        """Run access, admin, opt-out, anti-ban and spam checks; return a response to short-circuit"""
+        user_phone = request.sender_phone
+        user_message = request.message
+        
+        # 1. Check if bot is enabled
+        if not self.config_manager.config.enabled:
+            return ChatResponse(response="Bot is currently disabled.")
+        
+        # 2. Check maintenance mode
+        if self.config_manager.config.maintenance_mode:
+            return ChatResponse(response=self.config_manager.config.maintenance_message)
+        
+        # 3. Check if number is allowed
+        if not self.config_manager.is_number_allowed(user_phone):
+            logger.warning(f"Access denied for {user_phone}")
+            return ChatResponse(response="")  # Silent rejection
+        
+        # 4. Handle admin commands
+        if self.config_manager.is_admin(user_phone):
+            admin_response = await self._handle_admin_commands(user_message)
+            if admin_response:
+                return ChatResponse(response=admin_response)
+        
+        # 5. Check if user wants to opt out
+        if await self.anti_ban_service.handle_opt_out(user_phone, user_message):
+            return ChatResponse(response="You have been unsubscribed. Send any message to re-enable.")
+        
+        # 6. Check for spam in user message (before the anti-ban check, which counts the message)
+        is_spam, spam_reason = await self.anti_ban_service.check_message_for_spam(user_message)
+        if is_spam:
+            logger.warning(f"Spam detected from {user_phone}: {spam_reason}")
+            return ChatResponse(response="I can help you with questions, but please avoid promotional content.")
+        
+        # 7. Check anti-ban rules and record the message against the rate limits
+        allow_message, reason = await self.anti_ban_service.should_allow_message(user_phone, db)
+        if not allow_message:
+            logger.warning(f"Message blocked for {user_phone}: {reason}")
+            return ChatResponse(response=LIMITS_EXCEEDED)
+        
+        # 8. Add human-like delay BEFORE processing
+        delay = await self.anti_ban_service.get_human_like_delay()
+        logger.debug(f"Adding {delay:.2f}s delay before responding to {user_phone}")
+        await asyncio.sleep(delay)
+        
+        return None
+    
+    async def _prepare_context(self, request: ChatRequest, db: Session) -> Tuple[List[Dict[str, str]], str]:
+        """Load the (possibly summarized) conversation context and detect the response language"""
+        user = db_manager.get_or_create_user(db, request.sender_phone)
+        
+        # Get optimized conversation context with summarization
+        conversation_history, was_summarized = await self.conversation_service.get_optimized_conversation_context(
+            db, user.id, request.message, request.receiver_phone
+        )
+        
+        if was_summarized:
+            logger.info(f"Used summarized conversation context for {request.sender_phone}")
+        
+        # Detect language using the new language service
+        language = await self.language_service.get_language_for_conversation(request.message, user.id, db)
+        
+        return conversation_history, language
+    
+    async def _save_response(self, request: ChatRequest, response_message: str, language: str,
+                             db: Session) -> ChatResponse:
+        """Save the interaction (the message was already recorded for rate limiting when it was allowed)"""
+        chat_response = ChatResponse(response=response_message)
+        db_manager.save_interaction(
+            db=db,
+            interaction=ChatInteractionModel(
+                chat_request=request,
+                chat_response=chat_response,
+                timestamp=datetime.now(),
+                language=language
+            )
+        )
+        
+        return chat_response
+    
     async def _handle_admin_commands(self, message: str) -> str:
         """Handle admin commands for bot configuration"""
         message_lower = message.lower().strip()
@@ -303,7 +381,7 @@ class ChatController:
         
         return None  # Not an admin command
     
-    async def get_user_history(self, phone: str, receiver_phone: str = None, limit: int = 10, db: Session = Depends(get_db)) -> List[ChatInteractionModel]:
+    async def get_user_history(self, phone: str, receiver_phone: str = None, limit: int = 10, db: Session = Depends(get_db)) -> Iterator[ChatInteractionModel]:
         """
         Get conversation history for a user, optionally filtered by receiver_phone
         
@@ -314,7 +392,7 @@ class ChatController:
             db: Database session
             
         Returns:
-            List[ChatInteractionModel]: List of chat interactions
+            Iterator[ChatInteractionModel]: Chat interactions, mapped lazily as rows are fetched
         """
         user = db_manager.get_user_by_phone(db, phone)
         
@@ -324,13 +402,8 @@ class ChatController:
         # Get interactions from database, filtered by receiver_phone if provided
         interactions = db_manager.get_user_interactions(db, user.id, receiver_phone, limit)
         
-        # Convert DB models to Pydantic models
-        result = []
-        for interaction in interactions:
-            chat_interaction = map_db_interaction_to_api_interaction(interaction)
-            result.append(chat_interaction)
-        
-        return result
+        # Convert DB models to Pydantic models as rows are fetched
+        return (map_db_interaction_to_api_interaction(interaction) for interaction in interactions)
     
     async def get_anti_ban_stats(self) -> dict:
         """Get anti-ban related statistics"""
@@ -372,6 +445,10 @@ class ChatController:
         stats = self.conversation_service.get_conversation_stats(db, user.id)
         return stats
     
+    async def get_conversation_stats_for_users(self, user_ids: List[int], db: Session = Depends(get_db)) -> dict:
+        """Get conversation statistics for several users, keyed by user ID"""
+        return self.conversation_service.get_conversation_stats_for_users(db, user_ids)
+    
     async def force_conversation_summary(self, phone: str, language: str = None, 
                                        db: Session = Depends(get_db)) -> dict:
         """Force create a summary for a user's conversation"""
@@ -380,5 +457,5 @@ class ChatController:
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        result = self.conversation_service.force_create_summary(db, user.id, language)
+        result = await self.conversation_service.force_create_summary(db, user.id, language)
         return result 
\ No newline at end of file
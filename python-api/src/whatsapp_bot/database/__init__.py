@@ -1,8 +1,41 @@
 """
 Database package for WhatsApp OpenAI Bot
+
+The SQLAlchemy layer is imported on first attribute access, so importing the package
+or a submodule such as whatsapp_bot.database.schema does not load it.
 """
 
-from whatsapp_bot.database.database import db_manager, init_db, get_db
-from whatsapp_bot.database.models import Base, User, ChatInteraction, UsageLog
-from whatsapp_bot.database.schema import ChatRequest, ChatResponse, ChatInteraction as ChatInteractionSchema
-from whatsapp_bot.database.redis_cache import redis_cache 
\ No newline at end of file
+import importlib
+
+# Imported eagerly: the name is also the submodule's, which the import system would
+# otherwise bind on the package in place of the instance (the client connects lazily)
+from whatsapp_bot.database.redis_cache import redis_cache
+
+# Public name -> (submodule, attribute) for the lazily imported package attributes
+_LAZY_ATTRIBUTES = {
+    "db_manager": ("database", "db_manager"),
+    "init_db": ("database", "init_db"),
+    "Base": ("models", "Base"),
+    "User": ("models", "User"),
+    "ChatInteraction": ("models", "ChatInteraction"),
+    "UsageLog": ("models", "UsageLog"),
+    "ChatRequest": ("schema", "ChatRequest"),
+    "ChatResponse": ("schema", "ChatResponse"),
+    "ChatInteractionSchema": ("schema", "ChatInteraction"),
+}
+
+def get_db():
+    """Get database session (FastAPI dependency; loads SQLAlchemy on first use)"""
+    from whatsapp_bot.database.database import get_db as get_session
+    yield from get_session()
+
+def __getattr__(name: str):
+    try:
+        module_name, attribute = _LAZY_ATTRIBUTES[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(f"{__name__}.{module_name}"), attribute)
+    globals()[name] = value
+    return value
+
+__all__ = ["get_db", "redis_cache", *_LAZY_ATTRIBUTES]
@@ -1,31 +1,83 @@
-import os
 import json
 import redis
-from typing import List, Dict, Optional
-from dotenv import load_dotenv
+import redis.asyncio
+from typing import List, Dict, Optional, Tuple
+from whatsapp_bot.config import (
+    REDIS_URL, REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD, REDIS_MAX_CONNECTIONS
+)
 
-# Load environment variables
-load_dotenv()
-
-# Redis configuration
-REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
-REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
-REDIS_DB = int(os.getenv("REDIS_DB", 0))
-REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None)
 CACHE_TTL = 30 * 60  # 30 minutes in seconds
+CONFIG_RESPONSE_TTL = 30  # Config GET responses shared across workers, in seconds
+CONFIG_RESPONSE_PREFIX = "cfg:"
+
+_redis_client: Optional[redis.Redis] = None
+_async_redis_client: Optional[redis.asyncio.Redis] = None
+
+def get_redis() -> redis.Redis:
+    """
+    Get the process-wide Redis client
+    
+    The client is backed by a bounded connection pool and is thread-safe, so every
+    module shares it instead of opening its own connection.
+    """
+    global _redis_client
+    if _redis_client is None:
+        if REDIS_URL:
+            pool = redis.ConnectionPool.from_url(
+                REDIS_URL,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                decode_responses=True
+            )
+        else:
+            pool = redis.ConnectionPool(
+                host=REDIS_HOST,
+                port=REDIS_PORT,
+                db=REDIS_DB,
+                password=REDIS_PASSWORD,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                decode_responses=True  # Automatically decode responses to strings
+            )
+        _redis_client = redis.Redis(connection_pool=pool)
+    return _redis_client
+
+def get_async_redis() -> redis.asyncio.Redis:
+    """
+    Get the process-wide asyncio Redis client
+    
+    Used on hot request paths so Redis round trips don't block the event loop;
+    it has its own bounded connection pool with the same settings as get_redis().
+    """
+    global _async_redis_client
+    if _async_redis_client is None:
+        if REDIS_URL:
+            pool = redis.asyncio.ConnectionPool.from_url(
+                REDIS_URL,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                decode_responses=True
+            )
+        else:
+            pool = redis.asyncio.ConnectionPool(
+                host=REDIS_HOST,
+                port=REDIS_PORT,
+                db=REDIS_DB,
+                password=REDIS_PASSWORD,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                decode_responses=True
+            )
+        _async_redis_client = redis.asyncio.Redis(connection_pool=pool)
+    return _async_redis_client
 
 class RedisCache:
     """Redis cache manager for chat interactions"""
     
-    def __init__(self):
-        """Initialize Redis connection"""
-        self.redis_client = redis.Redis(
-            host=REDIS_HOST,
-            port=REDIS_PORT,
-            db=REDIS_DB,
-            password=REDIS_PASSWORD,
-            decode_responses=True  # Automatically decode responses to strings
-        )
+    def __init__(self, client: Optional[redis.Redis] = None):
+        """
+        Initialize Redis connection
+        
+        Args:
+            client: Redis client to use (defaults to the shared pooled client)
+        """
+        self.redis_client = client or get_redis()
         self.ttl = CACHE_TTL
     
     def get_user_key(self, user_id: int) -> str:
@@ -41,13 +93,29 @@ class RedisCache:
             role: Message role ('user' or 'assistant')
             content: Message content
         """
+        pipe = self.redis_client.pipeline(transaction=False)
+        self.stage_interaction(pipe, user_id, role, content)
+        pipe.execute()
+    
+    def stage_interaction(self, pipe: redis.client.Pipeline, user_id: int, role: str, content: str) -> None:
+        """
+        Queue the commands that cache a single interaction message on a pipeline
+        
+        Nothing is sent to Redis until the caller executes the pipeline.
+        
+        Args:
+            pipe: Pipeline to queue the commands on
+            user_id: User ID
+            role: Message role ('user' or 'assistant')
+            content: Message content
+        """
         key = self.get_user_key(user_id)
         # Serialize the message
         message = json.dumps({"role": role, "content": content})
         # Add to the list with RPUSH (appends to the right/end of the list)
-        self.redis_client.rpush(key, message)
+        pipe.rpush(key, message)
         # Reset TTL whenever we add new data
-        self.redis_client.expire(key, self.ttl)
+        pipe.expire(key, self.ttl)
     
     def cache_conversation(self, user_id: int, conversation: List[Dict[str, str]]) -> None:
         """
@@ -80,12 +148,10 @@ class RedisCache:
             List of conversation messages or None if not in cache
         """
         key = self.get_user_key(user_id)
-        # Check if key exists
-        if not self.redis_client.exists(key):
-            return None
-        
-        # Get all elements from the list
+        # Get all elements from the list (a missing key comes back as an empty list)
         serialized_messages = self.redis_client.lrange(key, 0, -1)
+        if not serialized_messages:
+            return None
         
         # Deserialize each message
         messages = []
@@ -107,6 +173,69 @@ class RedisCache:
         key = self.get_user_key(user_id)
         self.redis_client.delete(key)
     
+    def get_language_key(self, user_id: int) -> str:
+        """Generate Redis key for a user's last known language"""
+        return f"user:{user_id}:language"
+    
+    def get_user_language(self, user_id: int) -> Optional[str]:
+        """
+        Get the cached language for a user
+        
+        Args:
+            user_id: User ID
+            
+        Returns:
+            Language name or None if not in cache
+        """
+        return self.redis_client.get(self.get_language_key(user_id))
+    
+    def cache_user_language(self, user_id: int, language: str) -> None:
+        """
+        Cache the language used for a user's latest message
+        
+        Args:
+            user_id: User ID
+            language: Language name
+        """
+        self.redis_client.setex(self.get_language_key(user_id), self.ttl, language)
+    
+    async def get_config_response(self, name: str) -> Optional[Tuple[str, str]]:
+        """
+        Get a cached config endpoint response (on the asyncio client)
+        
+        Args:
+            name: Response name (e.g. 'config', 'summary', 'prompts:english')
+            
+        Returns:
+            (JSON body, ETag) or None if not in cache
+        """
+        body, etag = await get_async_redis().hmget(f"{CONFIG_RESPONSE_PREFIX}{name}", "body", "etag")
+        if body is None or etag is None:
+            return None
+        return body, etag
+    
+    async def cache_config_response(self, name: str, body: str, etag: str) -> None:
+        """
+        Cache a config endpoint response for all workers (on the asyncio client)
+        
+        Args:
+            name: Response name
+            body: JSON body
+            etag: ETag of the body
+        """
+        key = f"{CONFIG_RESPONSE_PREFIX}{name}"
+        pipe = get_async_redis().pipeline(transaction=False)
+        pipe.hset(key, mapping={"body": body, "etag": etag})
+        pipe.expire(key, CONFIG_RESPONSE_TTL)
+        await pipe.execute()
+    
+    async def clear_config_responses(self) -> None:
+        """Drop every cached config endpoint response after the configuration or prompts change"""
+        client = get_async_redis()
+        keys = [key async for key in client.scan_iter(match=f"{CONFIG_RESPONSE_PREFIX}*", count=100)]
+        if keys:
+            await client.delete(*keys)
+    
     def health_check(self) -> bool:
         """
         Check if Redis connection is healthy
@@ -120,4 +249,4 @@ class RedisCache:
             return False
 
 # Create singleton instance
-redis_cache = RedisCache() 
\ No newline at end of file
+redis_cache = RedisCache(get_redis()) 
\ No newline at end of file
@@ -1,16 +1,22 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from datetime import datetime
 
 class ChatRequest(BaseModel):
+    model_config = ConfigDict(frozen=True, defer_build=True)
+
     sender_phone: str
     receiver_phone: str
     message: str
 
 class ChatResponse(BaseModel):
+    model_config = ConfigDict(frozen=True, defer_build=True)
+
     response: str
 
 class ChatInteraction(BaseModel):
+    model_config = ConfigDict(frozen=True, defer_build=True)
+
     chat_request: ChatRequest
     chat_response: ChatResponse
     timestamp: datetime
-    language: str 
\ No newline at end of file
+    language: str
@@ -2,9 +2,10 @@ import argparse
 import os
 import subprocess
 import sys
-from dotenv import load_dotenv
 from pathlib import Path
 from whatsapp_bot.utils.logging_config import setup_logging, get_logger
+from whatsapp_bot.utils.backup_format import is_custom_format_dump
+from whatsapp_bot.config import load_env
 
 # Initialize logging
 setup_logging("INFO")
@@ -104,7 +105,11 @@ def restore_from_backup(db_name, db_user, db_password, db_host="localhost", back
         return False
     
     # Restore command
-    restore_command = f"PGPASSWORD={db_password} psql -h {db_host} -U {db_user} -d {db_name} -f {backup_file}"
+    if is_custom_format_dump(backup_file):
+        # Custom-format dumps restore in parallel
+        restore_command = f"PGPASSWORD={db_password} pg_restore -h {db_host} -U {db_user} -d {db_name} -j {os.cpu_count() or 1} --clean --if-exists {backup_file}"
+    else:
+        restore_command = f"PGPASSWORD={db_password} psql -h {db_host} -U {db_user} -d {db_name} -f {backup_file}"
     
     logger.info(f"Running restore command...")
     success, stdout, stderr = run_command(restore_command)
@@ -155,5 +160,5 @@ def main():
 
 if __name__ == "__main__":
     # Load environment variables
-    load_dotenv()
+    load_env()
     main() 
\ No newline at end of file
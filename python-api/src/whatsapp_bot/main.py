@@ -6,34 +6,29 @@ import uvicorn
 if sys.version_info < (3, 10):
     sys.exit("Error: This project requires Python 3.10 or higher")
 
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Optional
 from fastapi import FastAPI
-from dotenv import load_dotenv
 
-from whatsapp_bot.database import init_db
-from whatsapp_bot.controllers.chat_controller import ChatController
+from whatsapp_bot.utils.logging_config import setup_logging, get_logger
+from whatsapp_bot.utils.responses import ORJSONResponse
+from whatsapp_bot.config import load_env, get_prompts_dir, get_config_path
 from whatsapp_bot.routes import create_chat_router, create_health_router
 from whatsapp_bot.routes.chat_routes import create_anti_ban_router
 from whatsapp_bot.routes.config_routes import create_config_router
 from whatsapp_bot.routes.conversation_routes import create_conversation_router
-from whatsapp_bot.services.backup_service import DatabaseBackupService
-from whatsapp_bot.utils.logging_config import setup_logging, get_logger
-from whatsapp_bot.config import get_prompts_dir, get_config_path
 
-# Load environment variables
-load_dotenv()
+if TYPE_CHECKING:
+    from whatsapp_bot.controllers.chat_controller import ChatController
+
+# Load environment variables (no-op if the config module already parsed .env)
+load_env()
 
 # Initialize logging
 log_level = os.getenv("LOG_LEVEL", "INFO")
 setup_logging(log_level)
 logger = get_logger(__name__)
 
-# Initialize FastAPI app
-app = FastAPI(
-    title="WhatsApp OpenAI Bot API",
-    description="API for WhatsApp bot powered by OpenAI",
-    version="1.0.0"
-)
-
 # Get absolute path to prompts directory
 PROMPTS_DIR = get_prompts_dir()
 
@@ -55,35 +50,105 @@ default_prompts = {
 PROMPTS_DIR.mkdir(parents=True, exist_ok=True)
 logger.info(f"Using prompts directory: {PROMPTS_DIR.absolute()}")
 
-# Create default prompt files if they don't exist
+# Create default prompt files if they don't exist (one directory read instead of a stat per file)
+existing_prompts = {entry.name for entry in os.scandir(PROMPTS_DIR)}
 for filename, content in default_prompts.items():
-    file_path = PROMPTS_DIR / filename
-    if not file_path.exists():
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(content)
+    if filename not in existing_prompts:
+        file_path = PROMPTS_DIR / filename
+        file_path.write_text(content, encoding="utf-8")
         logger.info(f"Created default prompt file: {file_path}")
 
+class LazyChatController:
+    """
+    Stand-in for the ChatController that builds it on first use
+    
+    Routes are registered at import time with this proxy, while the controller and
+    its services (OpenAI client, anti-ban, summarization) are only constructed at
+    startup or on the first request.
+    """
+    
+    def __init__(self, prompts_dir: str):
+        self._prompts_dir = prompts_dir
+        self._controller: Optional["ChatController"] = None
+    
+    def get(self) -> "ChatController":
+        """Return the controller, constructing it on the first call"""
+        if self._controller is None:
+            # Imported here: the controller pulls in OpenAI, SQLAlchemy and the services
+            from whatsapp_bot.controllers.chat_controller import ChatController
+            self._controller = ChatController(self._prompts_dir)
+        return self._controller
+    
+    def __getattr__(self, name: str):
+        return getattr(self.get(), name)
+
 # Initialize controller with absolute prompts directory
-chat_controller = ChatController(str(PROMPTS_DIR))
-
-# Initialize database
-try:
-    init_db()
-    logger.info("Database tables initialized")
-except Exception as e:
-    logger.error(f"Error initializing database: {str(e)}")
-
-# Initialize backup service
-try:
-    database_url = os.getenv('DATABASE_URL')
-    if database_url:
-        backup_service = DatabaseBackupService(database_url)
-        backup_service.start_scheduler()
-        logger.info("Automated backup service started")
-    else:
-        logger.warning("DATABASE_URL not set, backup service disabled")
-except Exception as e:
-    logger.warning(f"Could not start backup service: {str(e)}")
+chat_controller = LazyChatController(str(PROMPTS_DIR))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Initialize the controller, database and backup service on server startup
+    
+    Routes are registered at module level; only the construction of the controller
+    and the background services happens here.
+    """
+    from whatsapp_bot.database import init_db
+    from whatsapp_bot.services.backup_service import DatabaseBackupService, claim_scheduler_lock
+    from whatsapp_bot.services.config_writer import ConfigWriter
+    from whatsapp_bot.config import config_manager
+    
+    chat_controller.get()
+    
+    # Initialize database
+    try:
+        init_db()
+        logger.info("Database tables initialized")
+    except Exception as e:
+        logger.error(f"Error initializing database: {str(e)}")
+    
+    # Initialize backup service in a single worker only (the scheduler lock), so workers don't race on backups
+    backup_service = None
+    backups_enabled = os.getenv("ENABLE_BACKUPS", "true").lower() == "true"
+    try:
+        database_url = os.getenv('DATABASE_URL')
+        if not backups_enabled:
+            logger.info("Backup service disabled")
+        elif not database_url:
+            logger.warning("DATABASE_URL not set, backup service disabled")
+        elif not claim_scheduler_lock():
+            logger.info("Backup service already running in another worker")
+        else:
+            backup_service = DatabaseBackupService(database_url)
+            backup_service.start_scheduler()
+            logger.info("Automated backup service started")
+    except Exception as e:
+        logger.warning(f"Could not start backup service: {str(e)}")
+    
+    # Persist config changes from a background task so mutation requests don't wait on disk
+    config_writer = ConfigWriter(config_manager)
+    config_writer.start()
+    
+    yield
+    
+    await config_writer.stop()
+    if backup_service is not None:
+        backup_service.shutdown()
+
+# Skip the OpenAPI schema and docs pages in production with DISABLE_OPENAPI=1
+OPENAPI_DISABLED = os.getenv("DISABLE_OPENAPI") == "1"
+
+# Initialize FastAPI app
+app = FastAPI(
+    title="WhatsApp OpenAI Bot API",
+    description="API for WhatsApp bot powered by OpenAI",
+    version="1.0.0",
+    openapi_url=None if OPENAPI_DISABLED else "/openapi.json",
+    docs_url=None if OPENAPI_DISABLED else "/docs",
+    redoc_url=None if OPENAPI_DISABLED else "/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
 
 # Include routers
 app.include_router(create_chat_router(chat_controller))
@@ -105,6 +170,7 @@ async def root():
         },
         "endpoints": {
             "chat": "/chat",
+            "chat_stream": "/chat/stream",
             "history": "/history/{phone}",
             "health": "/health",
             "redis_health": "/health/redis",
@@ -112,6 +178,7 @@ async def root():
             "anti_ban_stats": "/anti-ban/stats",
             "manual_opt_out": "/anti-ban/opt-out/{phone}",
             "conversation_stats": "/conversation/stats/{phone}",
+            "conversation_stats_bulk": "/conversation/stats?user_ids={id}&user_ids={id}",
             "force_summary": "/conversation/force-summary/{phone}",
             "config": "/config",
             "config_summary": "/config/summary",
@@ -149,21 +216,27 @@ def start_app():
         "app": "whatsapp_bot.main:app",
         "host": "0.0.0.0",
         "port": 8000,
-        "reload": reload_mode
+        "reload": reload_mode,
+        "timeout_keep_alive": int(os.getenv("UVICORN_TIMEOUT_KEEP_ALIVE", "30")),
+        "limit_concurrency": int(os.getenv("UVICORN_LIMIT_CONCURRENCY", "200"))  # Per worker
     }
     
     # If reload is enabled, configure what to watch
     if reload_mode:
         uvicorn_config.update({
-            "reload_dirs": ["src/whatsapp_bot"],  # Only watch source code
-            "reload_excludes": [
-                "*.log",
-                "*.sql", 
-                "backups/*",
-                "logs/*",
-                "__pycache__/*",
-                "*.pyc"
-            ]
+            # Only watch the package source; backups, logs and prompts live outside it and
+            # uvicorn already restricts reloads to *.py, so no exclude globs are needed
+            "reload_dirs": ["src/whatsapp_bot"],
+            "reload_delay": 0.5  # Debounce bursts of saves into one restart
+        })
+    else:
+        # C event loop and HTTP parser (uvloop is not available on Windows). One worker by
+        # default: configuration and prompt caches live in each process, so changes made
+        # through the API would only reach the worker that handled them
+        uvicorn_config.update({
+            "workers": int(os.getenv("UVICORN_WORKERS", "1")),
+            "loop": "asyncio" if sys.platform == "win32" else "uvloop",
+            "http": "httptools"
         })
     
     uvicorn.run(**uvicorn_config)
@@ -2,13 +2,14 @@ from whatsapp_bot.database.models import ChatInteraction
 from whatsapp_bot.database.schema import ChatInteraction as ChatInteractionModel, ChatRequest, ChatResponse
 
 def map_db_interaction_to_api_interaction(interaction: ChatInteraction) -> ChatInteractionModel:
-    return ChatInteractionModel(
-        chat_request=ChatRequest(
+    # Rows come from our own database, so skip validation and construct the models directly
+    return ChatInteractionModel.model_construct(
+        chat_request=ChatRequest.model_construct(
             sender_phone=interaction.user.phone, 
             receiver_phone=interaction.receiver_phone,
             message=interaction.request_message
         ),
-        chat_response=ChatResponse(response=interaction.response_message),
+        chat_response=ChatResponse.model_construct(response=interaction.response_message),
         timestamp=interaction.created_at,
         language=interaction.language
     )
@@ -1,15 +1,135 @@
+import asyncio
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
-from typing import Dict, Tuple, Optional, List, Any
+import random
+from functools import lru_cache
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from typing import AsyncIterator, Dict, Tuple, Optional, List, Any
 from whatsapp_bot.utils.logging_config import get_logger
-from whatsapp_bot.config import get_model_for_task, get_prompts_dir
-
-# Load environment variables
-load_dotenv()
+from whatsapp_bot.config import (
+    LANGUAGE_DETECTION_BACKEND, LID_CONFIDENCE_THRESHOLD, LID_MODEL_PATH, get_model_for_task, get_prompts_dir
+)
 
 logger = get_logger(__name__)
 
+# Keep-alive connection pool shared by all OpenAI requests in the process
+OPENAI_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+
+@lru_cache(maxsize=1)
+def _get_async_client() -> AsyncOpenAI:
+    """Return the process-wide AsyncOpenAI client so its connection pool is shared"""
+    return AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=DefaultAsyncHttpxClient(limits=OPENAI_HTTP_LIMITS)
+    )
+
+# Normalizes detector output (ISO codes or names) to the language names used for prompts
+LANGUAGE_MAPPINGS = {
+    'romanian': 'romanian',
+    'roma': 'romanian',
+    'ro': 'romanian',
+    'english': 'english', 
+    'en': 'english',
+    'spanish': 'spanish',
+    'es': 'spanish',
+    'french': 'french',
+    'fr': 'french',
+    'german': 'german',
+    'de': 'german',
+    'italian': 'italian',
+    'it': 'italian',
+    'portuguese': 'portuguese',
+    'pt': 'portuguese',
+    'dutch': 'dutch',
+    'nl': 'dutch',
+    'russian': 'russian',
+    'ru': 'russian',
+    'chinese': 'chinese',
+    'zh': 'chinese'
+}
+
+COMMON_LANGUAGES = frozenset(LANGUAGE_MAPPINGS.values())
+
+LANGUAGE_DETECTION_SYSTEM_MESSAGE = {
+    "role": "system", 
+    "content": """You are a language detection assistant. Respond with only the language name in lowercase. 
+    Supported languages: english, romanian, spanish, french, german, italian, portuguese, dutch, russian, chinese, japanese, korean, arabic, hebrew, hindi, turkish, polish, czech, hungarian, swedish, norwegian, danish, finnish.
+    If you cannot determine the language or it's not in the supported list, respond with 'english'."""
+}
+
+# The local model only sees this many leading characters; more adds cost, not accuracy
+LID_MAX_CHARS = 80
+
+_lid_model = None
+_lid_load_failed = False
+
+def _get_lid_model():
+    """Load the fastText language identification model on first use"""
+    global _lid_model, _lid_load_failed
+    if _lid_model is None and not _lid_load_failed:
+        try:
+            import fasttext
+            _lid_model = fasttext.load_model(LID_MODEL_PATH)
+            logger.info(f"Loaded local language detection model from {LID_MODEL_PATH}")
+        except Exception as e:
+            _lid_load_failed = True
+            logger.warning(f"Local language detection unavailable, using OpenAI instead: {str(e)}")
+    return _lid_model
+
+def _normalize_language(detected_language: str) -> str:
+    """Map a detected language to a known language name, defaulting to english"""
+    normalized_language = LANGUAGE_MAPPINGS.get(detected_language, detected_language)
+    if normalized_language not in COMMON_LANGUAGES:
+        return 'english'
+    return normalized_language
+
+DEFAULT_SYSTEM_PROMPT = "You are a helpful assistant. Provide clear and accurate responses."
+
+FALLBACK_RESPONSES = (
+    "I'm having trouble understanding right now. Could you try rephrasing that?",
+    "Sorry, I'm experiencing some technical difficulties. Can you try again?",
+    "I'm not quite sure how to respond to that. Could you be more specific?",
+    "Let me think about that... actually, could you ask that in a different way?"
+)
+
+# Appended to the system prompt per response style (conversational is the default, no suffix)
+STYLE_SUFFIXES = {
+    "brief": "\n\nIMPORTANT: Keep your responses brief and concise. Aim for 1-2 sentences maximum unless more detail is specifically requested.",
+    "detailed": "\n\nIMPORTANT: Provide detailed, comprehensive responses with explanations and examples when appropriate.",
+}
+
+# Prompt file contents keyed by path, as (mtime_ns, stripped text)
+_prompt_file_cache: Dict[str, Tuple[int, str]] = {}
+
+# Base prompt and styled system prompt keyed by (prompts_dir, language, response_style)
+_styled_prompt_cache: Dict[Tuple[str, str, str], Tuple[str, str]] = {}
+
+def _read_prompt(path: str) -> Optional[str]:
+    """
+    Read a prompt file, reusing the cached contents while its mtime is unchanged
+    
+    Returns:
+        Stripped prompt text, or None if the file does not exist
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    
+    hit = _prompt_file_cache.get(path)
+    if hit and hit[0] == mtime:
+        return hit[1]
+    
+    with open(path, 'r', encoding='utf-8') as f:
+        prompt = f.read().strip()
+    _prompt_file_cache[path] = (mtime, prompt)
+    return prompt
+
+def clear_prompt_cache() -> None:
+    """Drop cached prompt files and styled prompts"""
+    _prompt_file_cache.clear()
+    _styled_prompt_cache.clear()
+
 class OpenAIClient:
     def __init__(self, prompts_dir: Optional[str] = None):
         """
@@ -18,7 +138,7 @@ class OpenAIClient:
         Args:
             prompts_dir: Directory containing prompt files (will use absolute path if None)
         """
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = _get_async_client()
         
         # Always use absolute path to prompts directory
         if prompts_dir is None:
@@ -26,9 +146,14 @@ class OpenAIClient:
         else:
             self.prompts_dir = prompts_dir
         
+        self._prompts_dir_key = str(self.prompts_dir)
+        self._prompt_paths = {
+            lang: os.path.join(self.prompts_dir, f"{lang}.txt") for lang in ('english', 'romanian')
+        }
+        
         logger.info(f"OpenAI client initialized with prompts directory: {self.prompts_dir}")
     
-    def chat_completion(self, messages: List[Dict[str, str]], model: str = "gpt-3.5-turbo", 
+    async def chat_completion(self, messages: List[Dict[str, str]], model: str = "gpt-3.5-turbo", 
                        temperature: float = 0.7, max_tokens: int = 1000) -> Tuple[str, Optional[Dict[str, Any]]]:
         """
         Get chat completion from OpenAI
@@ -44,7 +169,7 @@ class OpenAIClient:
         """
         try:
             # Create the chat completion request
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=model,
                 messages=messages,
                 temperature=temperature,
@@ -61,7 +186,7 @@ class OpenAIClient:
                 "total_tokens": response.usage.total_tokens
             }
             
-            logger.info(f"Chat completion successful - Model: {model}, Total tokens: {usage_info['total_tokens']}")
+            logger.info("Chat completion successful - Model: %s, Total tokens: %s", model, usage_info['total_tokens'])
             
             return response_message, usage_info
             
@@ -69,9 +194,43 @@ class OpenAIClient:
             logger.error(f"Error in OpenAI API call: {str(e)}")
             raise
     
-    def detect_language(self, text: str) -> str:
+    async def chat_completion_stream(self, messages: List[Dict[str, str]], model: str = "gpt-3.5-turbo",
+                                     temperature: float = 0.7, max_tokens: int = 1000) -> AsyncIterator[str]:
         """
-        Detect the language of the input text using OpenAI
+        Stream a chat completion from OpenAI
+        
+        Args:
+            messages: List of message dictionaries with 'role' and 'content'
+            model: OpenAI model to use
+            temperature: Sampling temperature (0.0-2.0)
+            max_tokens: Maximum tokens in response
+            
+        Yields:
+            Response text chunks as they are generated
+        """
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        
+        async for chunk in stream:
+            if chunk.choices:
+                content = chunk.choices[0].delta.content
+                if content:
+                    yield content
+        
+        logger.info("Chat completion stream finished - Model: %s", model)
+    
+    async def detect_language(self, text: str) -> str:
+        """
+        Detect the language of the input text
+        
+        Uses the local fastText model when available and falls back to OpenAI
+        when it is not installed, its prediction fails or is below
+        LID_CONFIDENCE_THRESHOLD, or LANGUAGE_DETECTION_BACKEND is "openai".
         
         Args:
             text: Text to analyze
@@ -79,21 +238,71 @@ class OpenAIClient:
         Returns:
             Detected language code (e.g., 'english', 'romanian')
         """
+        if LANGUAGE_DETECTION_BACKEND != "openai":
+            lid_model = _get_lid_model()
+            if lid_model is not None:
+                try:
+                    labels, scores = lid_model.predict(text[:LID_MAX_CHARS].replace('\n', ' '), k=1)
+                    detected_language = labels[0].replace('__label__', '')
+                    if scores[0] >= LID_CONFIDENCE_THRESHOLD:
+                        logger.debug("Detected language: %s", detected_language)
+                        return _normalize_language(detected_language)
+                    logger.debug("Low confidence local detection (%s, %.2f), asking OpenAI", detected_language, scores[0])
+                except Exception as e:
+                    logger.error(f"Error in local language detection, asking OpenAI: {str(e)}")
+        
+        return await self._detect_language_openai(text)
+    
+    async def detect_languages(self, texts: List[str]) -> List[str]:
+        """
+        Detect the languages of several texts
+        
+        The local fastText model scores the whole batch in one predict call;
+        texts it is unsure about (or all of them, without the local model)
+        are sent to OpenAI concurrently.
+        
+        Args:
+            texts: Texts to analyze
+            
+        Returns:
+            Detected language codes, in the same order as the texts
+        """
+        detected: List[Optional[str]] = [None] * len(texts)
+        
+        if texts and LANGUAGE_DETECTION_BACKEND != "openai":
+            lid_model = _get_lid_model()
+            if lid_model is not None:
+                try:
+                    labels, scores = lid_model.predict(
+                        [text[:LID_MAX_CHARS].replace('\n', ' ') for text in texts], k=1
+                    )
+                except Exception as e:
+                    logger.error(f"Error in local language detection, asking OpenAI: {str(e)}")
+                else:
+                    for i, (label, score) in enumerate(zip(labels, scores)):
+                        if score[0] >= LID_CONFIDENCE_THRESHOLD:
+                            detected[i] = _normalize_language(label[0].replace('__label__', ''))
+        
+        pending = [i for i, language in enumerate(detected) if language is None]
+        if pending:
+            results = await asyncio.gather(*(self._detect_language_openai(texts[i]) for i in pending))
+            for i, language in zip(pending, results):
+                detected[i] = language
+        
+        return detected
+    
+    async def _detect_language_openai(self, text: str) -> str:
+        """Detect the language of the input text using OpenAI"""
         try:
             messages = [
-                {
-                    "role": "system", 
-                    "content": """You are a language detection assistant. Respond with only the language name in lowercase. 
-                    Supported languages: english, romanian, spanish, french, german, italian, portuguese, dutch, russian, chinese, japanese, korean, arabic, hebrew, hindi, turkish, polish, czech, hungarian, swedish, norwegian, danish, finnish.
-                    If you cannot determine the language or it's not in the supported list, respond with 'english'."""
-                },
+                LANGUAGE_DETECTION_SYSTEM_MESSAGE,
                 {
                     "role": "user", 
                     "content": f"What language is this text written in? Text: {text}"
                 }
             ]
             
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=get_model_for_task("translation"),
                 messages=messages,
                 max_tokens=15,
@@ -101,83 +310,71 @@ class OpenAIClient:
             )
             
             detected_language = response.choices[0].message.content.strip().lower()
-            logger.debug(f"Detected language: {detected_language}")
-            
-            # Common language mappings to handle variations
-            language_mappings = {
-                'romanian': 'romanian',
-                'roma': 'romanian',
-                'ro': 'romanian',
-                'english': 'english', 
-                'en': 'english',
-                'spanish': 'spanish',
-                'es': 'spanish',
-                'french': 'french',
-                'fr': 'french',
-                'german': 'german',
-                'de': 'german',
-                'italian': 'italian',
-                'it': 'italian',
-                'portuguese': 'portuguese',
-                'pt': 'portuguese',
-                'dutch': 'dutch',
-                'nl': 'dutch',
-                'russian': 'russian',
-                'ru': 'russian',
-                'chinese': 'chinese',
-                'zh': 'chinese'
-            }
+            logger.debug("Detected language: %s", detected_language)
             
-            # Normalize the detected language
-            normalized_language = language_mappings.get(detected_language, detected_language)
-            
-            # Final validation - if not a known language, default to english
-            common_languages = ['english', 'romanian', 'spanish', 'french', 'german', 'italian', 'portuguese', 'dutch', 'russian', 'chinese']
-            if normalized_language not in common_languages:
-                normalized_language = 'english'
-                
-            return normalized_language
+            return _normalize_language(detected_language)
             
         except Exception as e:
             logger.error(f"Error in language detection: {str(e)}")
             return 'english'  # Default fallback
     
-    def load_system_prompt(self, language: str = 'english') -> str:
+    def load_system_prompt(self, language: str = 'english', response_style: str = "conversational") -> str:
         """
-        Load system prompt from file based on detected language
+        Get the system prompt for a language with the response style applied
+        
+        The styled prompt is reused while the underlying prompt file is unchanged.
         
         Args:
             language: Language code (e.g., 'english', 'romanian')
+            response_style: Style of response (conversational, brief, detailed)
             
         Returns:
             System prompt text
         """
+        base_prompt = self._load_base_prompt(language)
+        cache_key = (self._prompts_dir_key, language, response_style)
+        hit = _styled_prompt_cache.get(cache_key)
+        if hit and hit[0] is base_prompt:
+            return hit[1]
+        
+        system_prompt = base_prompt + STYLE_SUFFIXES.get(response_style, "")
+        _styled_prompt_cache[cache_key] = (base_prompt, system_prompt)
+        return system_prompt
+    
+    def _load_base_prompt(self, language: str) -> str:
+        """Load the system prompt file for a language, falling back to English"""
         try:
             # Try to load the prompt file for the detected language
-            prompt_file = os.path.join(self.prompts_dir, f"{language}.txt")
+            prompt_file = self._prompt_paths.get(language) or os.path.join(self.prompts_dir, f"{language}.txt")
+            prompt = _read_prompt(prompt_file)
+            if prompt is not None:
+                logger.debug("Loaded system prompt for language: %s", language)
+                return prompt
             
-            if os.path.exists(prompt_file):
-                with open(prompt_file, 'r', encoding='utf-8') as f:
-                    prompt = f.read().strip()
-                logger.debug(f"Loaded system prompt for language: {language}")
+            # Fallback to English if the language-specific file doesn't exist
+            logger.warning(f"Prompt file for {language} not found, falling back to English")
+            prompt = _read_prompt(self._prompt_paths['english'])
+            if prompt is not None:
                 return prompt
-            else:
-                # Fallback to English if the language-specific file doesn't exist
-                logger.warning(f"Prompt file for {language} not found, falling back to English")
-                english_file = os.path.join(self.prompts_dir, "english.txt")
-                if os.path.exists(english_file):
-                    with open(english_file, 'r', encoding='utf-8') as f:
-                        prompt = f.read().strip()
-                    return prompt
-                else:
-                    # Ultimate fallback
-                    return "You are a helpful assistant. Provide clear and accurate responses."
+            
+            # Ultimate fallback
+            return DEFAULT_SYSTEM_PROMPT
                     
         except Exception as e:
             logger.error(f"Error reading prompt file: {str(e)}")
-            return "You are a helpful assistant. Provide clear and accurate responses."
+            return DEFAULT_SYSTEM_PROMPT
     
-    def generate_response(self, user_message: str, language: str = 'english', 
+    def _build_messages(self, user_message: str, language: str,
+                        conversation_history: Optional[List[Dict[str, str]]],
+                        response_style: str) -> List[Dict[str, str]]:
+        """Build the chat messages: styled system prompt, conversation history, current user message"""
+        return [
+            {"role": "system", "content": self.load_system_prompt(language, response_style)},
+            *(conversation_history or ()),
+            {"role": "user", "content": user_message}
+        ]
+    
+    async def generate_response(self, user_message: str, language: str = 'english', 
                          conversation_history: List[Dict[str, str]] = None, temperature: float = 0.7,
                          max_tokens: int = 2000, response_style: str = "conversational") -> str:
         """
@@ -195,28 +392,10 @@ class OpenAIClient:
             Generated response message
         """
         try:
-            # Load system prompt
-            system_prompt = self.load_system_prompt(language)
-            
-            # Modify system prompt based on response style
-            if response_style == "brief":
-                system_prompt += "\n\nIMPORTANT: Keep your responses brief and concise. Aim for 1-2 sentences maximum unless more detail is specifically requested."
-            elif response_style == "detailed":
-                system_prompt += "\n\nIMPORTANT: Provide detailed, comprehensive responses with explanations and examples when appropriate."
-            # conversational is the default, no modification needed
-            
-            # Build messages array
-            messages = [{"role": "system", "content": system_prompt}]
-            
-            # Add conversation history if provided
-            if conversation_history:
-                messages.extend(conversation_history)
-            
-            # Add current user message
-            messages.append({"role": "user", "content": user_message})
+            messages = self._build_messages(user_message, language, conversation_history, response_style)
             
             # Generate response with specified parameters
-            response_message, _ = self.chat_completion(
+            response_message, _ = await self.chat_completion(
                 messages=messages,
                 model=get_model_for_task("chat"),
                 temperature=temperature,
@@ -228,11 +407,45 @@ class OpenAIClient:
         except Exception as e:
             logger.error(f"Error generating response: {str(e)}")
             # Return a human-like fallback response
-            fallback_responses = [
-                "I'm having trouble understanding right now. Could you try rephrasing that?",
-                "Sorry, I'm experiencing some technical difficulties. Can you try again?",
-                "I'm not quite sure how to respond to that. Could you be more specific?",
-                "Let me think about that... actually, could you ask that in a different way?"
-            ]
-            import random
-            return random.choice(fallback_responses) 
\ No newline at end of file
+            return random.choice(FALLBACK_RESPONSES)
+    
+    async def generate_response_stream(self, user_message: str, language: str = 'english', 
+                                       conversation_history: List[Dict[str, str]] = None, temperature: float = 0.7,
+                                       max_tokens: int = 2000, response_style: str = "conversational") -> AsyncIterator[str]:
+        """
+        Generate a response like generate_response, yielding text chunks as they arrive
+        
+        Yields:
+            Response text chunks; a fallback response if generation fails before any output
+        """
+        messages = self._build_messages(user_message, language, conversation_history, response_style)
+        has_output = False
+        
+        try:
+            async for chunk in self.chat_completion_stream(
+                messages=messages,
+                model=get_model_for_task("chat"),
+                temperature=temperature,
+                max_tokens=max_tokens
+            ):
+                has_output = True
+                yield chunk
+                
+        except Exception as e:
+            logger.error(f"Error streaming response: {str(e)}")
+            if not has_output:
+                yield random.choice(FALLBACK_RESPONSES)
+
+
+@lru_cache(maxsize=None)
+def _get_openai_client(prompts_dir: str) -> OpenAIClient:
+    return OpenAIClient(prompts_dir)
+
+def get_openai_client(prompts_dir: Optional[str] = None) -> OpenAIClient:
+    """
+    Return the shared OpenAIClient for a prompts directory
+    
+    Args:
+        prompts_dir: Directory containing prompt files (project prompts directory if None)
+    """
+    return _get_openai_client(str(prompts_dir or get_prompts_dir()))
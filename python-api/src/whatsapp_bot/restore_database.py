@@ -2,7 +2,8 @@
 """
 Database restoration script for WhatsApp OpenAI Bot
 
-This script demonstrates how to restore the database from a backup SQL file.
+This script demonstrates how to restore the database from a backup file
+(plain SQL via psql, or a custom-format .dump via parallel pg_restore).
 """
 
 import os
@@ -10,6 +11,7 @@ import subprocess
 import sys
 from pathlib import Path
 from whatsapp_bot.utils.logging_config import setup_logging, get_logger
+from whatsapp_bot.utils.backup_format import is_custom_format_dump
 
 # Initialize logging
 setup_logging("INFO")
@@ -37,16 +39,26 @@ def restore_database(backup_file: str, database_url: str) -> bool:
             logger.error(f"Error: Backup file not found at {backup_file}")
             return False
         
-        # Run psql command to restore
-        result = subprocess.run(['psql', database_url, '-f', backup_file], 
-                              capture_output=True, text=True)
+        if is_custom_format_dump(backup_file):
+            # Custom-format dumps restore tables and indexes in parallel
+            cmd = ['pg_restore', '-j', str(os.cpu_count() or 1), '--clean', '--if-exists',
+                   '-d', database_url, backup_file]
+        else:
+            # Plain SQL dumps are replayed by psql
+            cmd = ['psql', database_url, '-f', backup_file]
+        
+        # Run the restore command, streaming its output instead of buffering it in memory
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              text=True, bufsize=1) as process:
+            for line in process.stdout:
+                logger.info(line.rstrip())
+            returncode = process.wait()
         
-        if result.returncode == 0:
+        if returncode == 0:
             logger.info("Database restoration completed successfully!")
             return True
         else:
-            logger.error("Database restoration failed.")
-            logger.error(f"Error output: {result.stderr}")
+            logger.error(f"Database restoration failed with return code {returncode}.")
             return False
             
     except Exception as e:
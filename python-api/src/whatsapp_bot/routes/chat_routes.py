@@ -1,34 +1,51 @@
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi.responses import StreamingResponse
+from typing import TYPE_CHECKING, List, Optional
 
 from whatsapp_bot.database.schema import ChatRequest, ChatResponse, ChatInteraction as ChatInteractionModel
 from whatsapp_bot.database import get_db
-from whatsapp_bot.controllers.chat_controller import ChatController
+from whatsapp_bot.utils.responses import ORJSONResponse
 
-def create_chat_router(chat_controller: ChatController) -> APIRouter:
+if TYPE_CHECKING:
+    # Only for annotations: the controller pulls in OpenAI and SQLAlchemy
+    from whatsapp_bot.controllers.chat_controller import ChatController
+
+def create_chat_router(chat_controller: "ChatController") -> APIRouter:
     """Create and configure chat routes"""
     router = APIRouter(tags=["chat"])
     
     @router.post("/chat", response_model=ChatResponse)
-    async def chat_endpoint(request: ChatRequest, db: Session = Depends(get_db)):
+    async def chat_endpoint(request: ChatRequest, db=Depends(get_db)):
         """Handle chat interactions with users"""
         return await chat_controller.chat_endpoint(request, db)
     
-    @router.get("/history/{phone}", response_model=List[ChatInteractionModel])
+    @router.post("/chat/stream")
+    async def chat_stream_endpoint(request: ChatRequest, db=Depends(get_db)):
+        """Handle chat interactions, streaming the response as it is generated"""
+        return StreamingResponse(
+            chat_controller.chat_stream_endpoint(request, db),
+            media_type="text/event-stream"
+        )
+    
+    @router.get(
+        "/history/{phone}",
+        response_class=ORJSONResponse,
+        responses={200: {"model": List[ChatInteractionModel]}}
+    )
     async def get_user_history(
         phone: str, 
         receiver_phone: Optional[str] = Query(None, description="Filter by receiver phone number"),
         limit: int = Query(10, description="Maximum number of interactions to return"),
-        db: Session = Depends(get_db)
+        db=Depends(get_db)
     ):
         """Get conversation history for a user, optionally filtered by receiver phone"""
-        return await chat_controller.get_user_history(phone, receiver_phone, limit, db)
+        interactions = await chat_controller.get_user_history(phone, receiver_phone, limit, db)
+        return ORJSONResponse([interaction.model_dump() for interaction in interactions])
     
     return router
 
 
-def create_health_router(chat_controller: ChatController) -> APIRouter:
+def create_health_router(chat_controller: "ChatController") -> APIRouter:
     """Create and configure health check routes"""
     router = APIRouter(tags=["health"])
     
@@ -50,7 +67,7 @@ def create_health_router(chat_controller: ChatController) -> APIRouter:
     return router
 
 
-def create_anti_ban_router(chat_controller: ChatController) -> APIRouter:
+def create_anti_ban_router(chat_controller: "ChatController") -> APIRouter:
     """Create and configure anti-ban management routes"""
     router = APIRouter(tags=["anti-ban"])
     
@@ -65,12 +82,12 @@ def create_anti_ban_router(chat_controller: ChatController) -> APIRouter:
         return await chat_controller.manual_opt_out(phone)
     
     @router.get("/conversation/stats/{phone}")
-    async def get_conversation_stats(phone: str, db: Session = Depends(get_db)):
+    async def get_conversation_stats(phone: str, db=Depends(get_db)):
         """Get conversation statistics for a user"""
         return await chat_controller.get_conversation_stats(phone, db)
     
     @router.post("/conversation/force-summary/{phone}")
-    async def force_conversation_summary(phone: str, language: str = None, db: Session = Depends(get_db)):
+    async def force_conversation_summary(phone: str, language: str = None, db=Depends(get_db)):
         """Force create a summary for a user's conversation"""
         return await chat_controller.force_conversation_summary(phone, language, db)
     
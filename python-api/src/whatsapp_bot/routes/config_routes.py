@@ -1,91 +1,255 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
+import asyncio
+import orjson
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from pydantic import BaseModel, ConfigDict
+from starlette.concurrency import run_in_threadpool
 
 from whatsapp_bot.config import config_manager, get_prompts_dir
-from whatsapp_bot.database import db_manager, get_db
+from whatsapp_bot.database import get_db, redis_cache
+from whatsapp_bot.utils.logging_config import get_logger
+from whatsapp_bot.utils.responses import ORJSONResponse, compute_etag, etag_response
+
+logger = get_logger(__name__)
 
 class ResponseConfigUpdate(BaseModel):
-    max_tokens: int = None
-    min_tokens: int = None
-    temperature: float = None
-    response_style: str = None
+    model_config = ConfigDict(extra="forbid")
+
+    max_tokens: Optional[int] = None
+    min_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+    response_style: Optional[str] = None
 
 class ModelConfigUpdate(BaseModel):
-    default: str = None
-    chat: str = None
-    summarization: str = None
-    translation: str = None
-    analysis: str = None
-    creative: str = None
-    admin_commands: str = None
+    model_config = ConfigDict(extra="forbid")
+
+    default: Optional[str] = None
+    chat: Optional[str] = None
+    summarization: Optional[str] = None
+    translation: Optional[str] = None
+    analysis: Optional[str] = None
+    creative: Optional[str] = None
+    admin_commands: Optional[str] = None
 
 class AccessConfigUpdate(BaseModel):
-    allowed_numbers: List[str] = None
-    blocked_numbers: List[str] = None
-    whitelist_mode: bool = None
-    admin_numbers: List[str] = None
+    model_config = ConfigDict(extra="forbid")
+
+    allowed_numbers: Optional[List[str]] = None
+    blocked_numbers: Optional[List[str]] = None
+    whitelist_mode: Optional[bool] = None
+    admin_numbers: Optional[List[str]] = None
 
 class BotConfigUpdate(BaseModel):
-    enabled: bool = None
-    maintenance_mode: bool = None
-    maintenance_message: str = None
+    model_config = ConfigDict(extra="forbid")
+
+    enabled: Optional[bool] = None
+    maintenance_mode: Optional[bool] = None
+    maintenance_message: Optional[str] = None
+
+class PhoneBatch(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    add: List[str] = []
+    remove: List[str] = []
 
 class PromptUpdate(BaseModel):
-    system_prompt: str = None
-    summary_prompt: str = None
+    model_config = ConfigDict(extra="forbid")
+
+    system_prompt: Optional[str] = None
+    summary_prompt: Optional[str] = None
+
+# Languages whose prompts can be read and updated through the API
+_SUPPORTED_LANGUAGES_DISPLAY = ("english", "romanian", "default")
+_SUPPORTED_LANGUAGES = frozenset(_SUPPORTED_LANGUAGES_DISPLAY)
+_AVAILABLE_LANGUAGES_MESSAGE = f"Available languages: {list(_SUPPORTED_LANGUAGES_DISPLAY)}"
+
+# (system prompt, summary prompt) file paths per supported language
+_PROMPT_PATHS: Dict[str, Tuple[Path, Path]] = {
+    language: (get_prompts_dir() / f"{language}.txt", get_prompts_dir() / f"summary_{language}.txt")
+    for language in _SUPPORTED_LANGUAGES
+}
+
+# Prompt file contents keyed by path, with the file's mtime (ns) used to detect edits
+_prompt_cache: Dict[Path, Tuple[int, str]] = {}
+
+def _stat_mtime(path: Path) -> Optional[int]:
+    """Get a file's mtime in ns, or None if it does not exist"""
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+async def _read_cached(path: Path, mtime: Optional[int]) -> Optional[str]:
+    """Read a prompt file, reusing the cached contents while its mtime is unchanged"""
+    if mtime is None:
+        return None
+    
+    hit = _prompt_cache.get(path)
+    if hit and hit[0] == mtime:
+        return hit[1]
+    
+    # Only cache misses touch the file contents, off the event loop
+    data = await run_in_threadpool(path.read_text, encoding="utf-8")
+    _prompt_cache[path] = (mtime, data)
+    return data
+
+async def _read_prompt_pair(system_file: Path, summary_file: Path) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Read a language's system and summary prompts
+    
+    Both files are stat'ed up front, so when both cache entries are current no file is opened;
+    otherwise the misses are read concurrently.
+    
+    Returns:
+        (system prompt, summary prompt), each None if the file does not exist
+    """
+    system_mtime = _stat_mtime(system_file)
+    summary_mtime = _stat_mtime(summary_file)
+    system_prompt, summary_prompt = await asyncio.gather(
+        _read_cached(system_file, system_mtime),
+        _read_cached(summary_file, summary_mtime)
+    )
+    return system_prompt, summary_prompt
+
+# (list path segment, HTTP method, ConfigManager method, status message, description)
+_NUMBER_OPS = (
+    ("allow", "POST", "add_allowed_number", "Added {phone} to allowed numbers", "Add a phone number to the allowed list"),
+    ("allow", "DELETE", "remove_allowed_number", "Removed {phone} from allowed numbers", "Remove a phone number from the allowed list"),
+    ("block", "POST", "add_blocked_number", "Added {phone} to blocked numbers", "Add a phone number to the blocked list"),
+    ("block", "DELETE", "remove_blocked_number", "Removed {phone} from blocked numbers", "Remove a phone number from the blocked list"),
+    ("admin", "POST", "add_admin_number", "Added {phone} to admin numbers", "Add a phone number to the admin list"),
+    ("admin", "DELETE", "remove_admin_number", "Removed {phone} from admin numbers", "Remove a phone number from the admin list"),
+)
+
+async def _shared_response(request: Request, name: str,
+                           build: Callable[[], Awaitable[Tuple[bytes, str]]]) -> Response:
+    """
+    Serve a config GET response through the Redis cache shared by all workers
+    
+    Falls back to building the response locally when Redis is unavailable.
+    
+    Args:
+        request: Incoming request (checked for If-None-Match)
+        name: Cache entry name
+        build: Coroutine function returning the (JSON body, ETag) to cache on a miss
+    """
+    try:
+        cached = await redis_cache.get_config_response(name)
+    except Exception as e:
+        logger.warning(f"Config response cache unavailable: {str(e)}")
+        body, etag = await build()
+        return etag_response(request, body, etag)
+    
+    if cached:
+        body, etag = cached
+        return etag_response(request, body.encode("utf-8"), etag)
+    
+    body, etag = await build()
+    try:
+        await redis_cache.cache_config_response(name, body.decode("utf-8"), etag)
+    except Exception as e:
+        logger.warning(f"Could not cache config response '{name}': {str(e)}")
+    return etag_response(request, body, etag)
+
+async def _clear_shared_responses() -> None:
+    """Invalidate the config responses cached in Redis after a change"""
+    try:
+        await redis_cache.clear_config_responses()
+    except Exception as e:
+        logger.warning(f"Could not clear cached config responses: {str(e)}")
+
+# Clears scheduled by the change listener, referenced until they finish
+_pending_clears: Set[asyncio.Task] = set()
+
+def _on_config_change() -> None:
+    """
+    Invalidate the shared config responses after any configuration change
+    
+    Runs for API routes and admin chat commands alike, as both go through ConfigManager.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Not serving (e.g. the initial load); cached entries expire after CONFIG_RESPONSE_TTL
+        return
+    task = loop.create_task(_clear_shared_responses())
+    _pending_clears.add(task)
+    task.add_done_callback(_pending_clears.discard)
+
+config_manager.add_change_listener(_on_config_change)
+
+def _clear_prompt_caches() -> None:
+    """Drop the prompt caches of the OpenAI client and the summarization service"""
+    # Imported here so loading the routes doesn't pull in OpenAI and SQLAlchemy
+    from whatsapp_bot.openai_client import clear_prompt_cache
+    from whatsapp_bot.services.conversation_service import clear_conversation_prompt_cache
+    clear_prompt_cache()
+    clear_conversation_prompt_cache()
+
+def _accepted(content: Dict[str, Any]) -> ORJSONResponse:
+    """Build a 202 response for a config mutation, rendered directly without jsonable_encoder"""
+    return ORJSONResponse(content, status_code=202)
+
+def _make_number_handler(fn_name: str, status_template: str):
+    """Build a route handler that applies one ConfigManager number operation"""
+    async def handler(phone: str):
+        getattr(config_manager, fn_name)(phone)
+        return _accepted({"status": status_template.format(phone=phone)})
+    return handler
 
 def create_config_router() -> APIRouter:
-    """Create and configure configuration management routes"""
-    router = APIRouter(tags=["config"])
+    """
+    Create and configure configuration management routes
+    
+    Config mutations apply in memory and answer 202 Accepted; the file write is left
+    to the background config writer when one is running.
+    """
+    router = APIRouter(tags=["config"], default_response_class=ORJSONResponse)
     
     @router.get("/config")
-    async def get_config():
+    async def get_config(request: Request):
         """Get current bot configuration"""
-        return {
-            "models": config_manager.config.models.__dict__,
-            "response": config_manager.config.response.__dict__,
-            "access": config_manager.config.access.__dict__,
-            "anti_ban": config_manager.config.anti_ban.__dict__,
-            "enabled": config_manager.config.enabled,
-            "maintenance_mode": config_manager.config.maintenance_mode,
-            "maintenance_message": config_manager.config.maintenance_message
-        }
+        async def build():
+            return config_manager.serialized_config()
+        return await _shared_response(request, "config", build)
     
     @router.get("/config/summary")
-    async def get_config_summary():
+    async def get_config_summary(request: Request):
         """Get configuration summary"""
-        return config_manager.get_config_summary()
+        async def build():
+            return config_manager.serialized_config_summary()
+        return await _shared_response(request, "summary", build)
     
     @router.post("/config/reload")
     async def reload_config():
         """Reload configuration from file"""
         config_manager.reload_config()
+        _clear_prompt_caches()
         return {"status": "Configuration reloaded successfully"}
     
-    @router.put("/config/response")
+    @router.put("/config/response", status_code=202, response_model=None)
     async def update_response_config(update: ResponseConfigUpdate):
         """Update response configuration"""
-        update_dict = {k: v for k, v in update.dict().items() if v is not None}
+        update_dict = update.model_dump(exclude_none=True, exclude_unset=True)
         config_manager.update_response_config(**update_dict)
-        return {"status": "Response configuration updated"}
+        return _accepted({"status": "Response configuration updated"})
     
-    @router.put("/config/models")
+    @router.put("/config/models", status_code=202, response_model=None)
     async def update_model_config(update: ModelConfigUpdate):
         """Update model configuration"""
-        update_dict = {k: v for k, v in update.dict().items() if v is not None}
+        update_dict = update.model_dump(exclude_none=True, exclude_unset=True)
         config_manager.update_model_config(**update_dict)
-        return {"status": "Model configuration updated"}
+        return _accepted({"status": "Model configuration updated"})
     
-    @router.put("/config/access")
+    @router.put("/config/access", status_code=202, response_model=None)
     async def update_access_config(update: AccessConfigUpdate):
         """Update access configuration"""
-        update_dict = {k: v for k, v in update.dict().items() if v is not None}
+        update_dict = update.model_dump(exclude_none=True, exclude_unset=True)
         config_manager.update_access_config(**update_dict)
-        return {"status": "Access configuration updated"}
+        return _accepted({"status": "Access configuration updated"})
     
-    @router.put("/config/bot")
+    @router.put("/config/bot", status_code=202, response_model=None)
     async def update_bot_config(update: BotConfigUpdate):
         """Update general bot configuration"""
         if update.enabled is not None:
@@ -96,43 +260,38 @@ def create_config_router() -> APIRouter:
             config_manager.config.maintenance_message = update.maintenance_message
         
         config_manager.save_config()
-        return {"status": "Bot configuration updated"}
-    
-    @router.post("/config/numbers/allow/{phone}")
-    async def add_allowed_number(phone: str):
-        """Add a phone number to the allowed list"""
-        config_manager.add_allowed_number(phone)
-        return {"status": f"Added {phone} to allowed numbers"}
+        return _accepted({"status": "Bot configuration updated"})
     
-    @router.delete("/config/numbers/allow/{phone}")
-    async def remove_allowed_number(phone: str):
-        """Remove a phone number from the allowed list"""
-        config_manager.remove_allowed_number(phone)
-        return {"status": f"Removed {phone} from allowed numbers"}
+    # Batch routes are registered before the /{phone} routes so "batch" is not taken as a number
+    @router.post("/config/numbers/allow/batch", status_code=202, response_model=None)
+    async def update_allowed_numbers(batch: PhoneBatch):
+        """Add and remove several allowed numbers, saving the configuration once"""
+        result = config_manager.update_numbers("allowed_numbers", batch.add, batch.remove)
+        return _accepted({"status": "Allowed numbers updated", **result})
     
-    @router.post("/config/numbers/block/{phone}")
-    async def add_blocked_number(phone: str):
-        """Add a phone number to the blocked list"""
-        config_manager.add_blocked_number(phone)
-        return {"status": f"Added {phone} to blocked numbers"}
+    @router.post("/config/numbers/block/batch", status_code=202, response_model=None)
+    async def update_blocked_numbers(batch: PhoneBatch):
+        """Add and remove several blocked numbers, saving the configuration once"""
+        result = config_manager.update_numbers("blocked_numbers", batch.add, batch.remove)
+        return _accepted({"status": "Blocked numbers updated", **result})
     
-    @router.delete("/config/numbers/block/{phone}")
-    async def remove_blocked_number(phone: str):
-        """Remove a phone number from the blocked list"""
-        config_manager.remove_blocked_number(phone)
-        return {"status": f"Removed {phone} from blocked numbers"}
+    @router.post("/config/numbers/admin/batch", status_code=202, response_model=None)
+    async def update_admin_numbers(batch: PhoneBatch):
+        """Add and remove several admin numbers, saving the configuration once"""
+        result = config_manager.update_numbers("admin_numbers", batch.add, batch.remove)
+        return _accepted({"status": "Admin numbers updated", **result})
     
-    @router.post("/config/numbers/admin/{phone}")
-    async def add_admin_number(phone: str):
-        """Add a phone number to the admin list"""
-        config_manager.add_admin_number(phone)
-        return {"status": f"Added {phone} to admin numbers"}
-    
-    @router.delete("/config/numbers/admin/{phone}")
-    async def remove_admin_number(phone: str):
-        """Remove a phone number from the admin list"""
-        config_manager.remove_admin_number(phone)
-        return {"status": f"Removed {phone} from admin numbers"}
+    # Single-number add/remove routes, one per (list, method) pair
+    for category, method, fn_name, status_template, description in _NUMBER_OPS:
+        router.add_api_route(
+            f"/config/numbers/{category}/{{phone}}",
+            _make_number_handler(fn_name, status_template),
+            methods=[method],
+            status_code=202,
+            response_model=None,
+            name=fn_name,
+            description=description,
+        )
     
     @router.get("/config/numbers/check/{phone}")
     async def check_number_access(phone: str):
@@ -148,91 +307,75 @@ def create_config_router() -> APIRouter:
             "bot_enabled": config_manager.config.enabled
         }
     
-    @router.post("/config/maintenance")
-    async def set_maintenance_mode(enabled: bool, message: str = None):
+    @router.post("/config/maintenance", status_code=202, response_model=None)
+    async def set_maintenance_mode(enabled: bool, message: Optional[str] = None):
         """Enable or disable maintenance mode"""
         config_manager.set_maintenance_mode(enabled, message)
-        return {
+        return _accepted({
             "status": f"Maintenance mode {'enabled' if enabled else 'disabled'}",
             "message": config_manager.config.maintenance_message
-        }
+        })
     
     @router.get("/config/prompts/{language}")
-    async def get_prompts_by_language(language: str):
+    async def get_prompts_by_language(language: str, request: Request):
         """Get system and summary prompts for a specific language"""
-        prompts_dir = get_prompts_dir()
-        
-        # Define supported languages
-        supported_languages = ["english", "romanian", "default"]
-        
-        if language not in supported_languages:
+        if language not in _SUPPORTED_LANGUAGES:
             raise HTTPException(
                 status_code=400, 
-                detail=f"Language '{language}' not supported. Available languages: {supported_languages}"
+                detail=f"Language '{language}' not supported. {_AVAILABLE_LANGUAGES_MESSAGE}"
             )
         
-        try:
-            # Read system prompt
-            system_prompt_file = prompts_dir / f"{language}.txt"
-            if not system_prompt_file.exists():
+        system_prompt_file, summary_prompt_file = _PROMPT_PATHS[language]
+        
+        async def build():
+            try:
+                system_prompt, summary_prompt = await _read_prompt_pair(system_prompt_file, summary_prompt_file)
+                if system_prompt is None:
+                    raise HTTPException(
+                        status_code=404, 
+                        detail=f"System prompt file not found for language '{language}'"
+                    )
+                
+                body = orjson.dumps({
+                    "language": language,
+                    "system_prompt": system_prompt,
+                    "summary_prompt": summary_prompt,
+                    "has_summary_prompt": summary_prompt is not None
+                })
+                return body, compute_etag(body)
+                
+            except Exception as e:
                 raise HTTPException(
-                    status_code=404, 
-                    detail=f"System prompt file not found for language '{language}'"
+                    status_code=500,
+                    detail=f"Error reading prompt files: {str(e)}"
                 )
-            
-            with open(system_prompt_file, 'r', encoding='utf-8') as f:
-                system_prompt = f.read()
-            
-            # Read summary prompt
-            summary_prompt_file = prompts_dir / f"summary_{language}.txt"
-            summary_prompt = None
-            
-            if summary_prompt_file.exists():
-                with open(summary_prompt_file, 'r', encoding='utf-8') as f:
-                    summary_prompt = f.read()
-            
-            return {
-                "language": language,
-                "system_prompt": system_prompt,
-                "summary_prompt": summary_prompt,
-                "has_summary_prompt": summary_prompt is not None
-            }
-            
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Error reading prompt files: {str(e)}"
-                        )
+        
+        return await _shared_response(request, f"prompts:{language}", build)
     
     @router.put("/config/prompt/{language}")
     async def update_prompts_by_language(language: str, prompt_update: PromptUpdate):
         """Update system and/or summary prompts for a specific language"""
-        prompts_dir = get_prompts_dir()
-        
-        # Define supported languages
-        supported_languages = ["english", "romanian", "default"]
-        
-        if language not in supported_languages:
+        if language not in _SUPPORTED_LANGUAGES:
             raise HTTPException(
                 status_code=400, 
-                detail=f"Language '{language}' not supported. Available languages: {supported_languages}"
+                detail=f"Language '{language}' not supported. {_AVAILABLE_LANGUAGES_MESSAGE}"
             )
         
+        system_prompt_file, summary_prompt_file = _PROMPT_PATHS[language]
+        
         try:
             updated_files = []
             
             # Update system prompt if provided
             if prompt_update.system_prompt is not None:
-                system_prompt_file = prompts_dir / f"{language}.txt"
-                with open(system_prompt_file, 'w', encoding='utf-8') as f:
-                    f.write(prompt_update.system_prompt)
+                await run_in_threadpool(system_prompt_file.write_text, prompt_update.system_prompt, encoding='utf-8')
+                _prompt_cache.pop(system_prompt_file, None)
                 updated_files.append(f"system prompt ({language}.txt)")
             
             # Update summary prompt if provided
             if prompt_update.summary_prompt is not None:
-                summary_prompt_file = prompts_dir / f"summary_{language}.txt"
-                with open(summary_prompt_file, 'w', encoding='utf-8') as f:
-                    f.write(prompt_update.summary_prompt)
+                await run_in_threadpool(summary_prompt_file.write_text, prompt_update.summary_prompt, encoding='utf-8')
+                _prompt_cache.pop(summary_prompt_file, None)
                 updated_files.append(f"summary prompt (summary_{language}.txt)")
             
             if not updated_files:
@@ -241,6 +384,9 @@ def create_config_router() -> APIRouter:
                     detail="No prompts provided. Please include system_prompt and/or summary_prompt in the request body."
                 )
             
+            _clear_prompt_caches()
+            await _clear_shared_responses()
+                
             return {
                 "status": "Prompts updated successfully",
                 "language": language,
@@ -255,8 +401,10 @@ def create_config_router() -> APIRouter:
             )
 
     @router.delete("/config/erase/{phone}")
-    async def erase_user_data(phone: str, db: Session = Depends(get_db)):
+    async def erase_user_data(phone: str, db=Depends(get_db)):
         """Erase all conversations/data for a user by phone number"""
+        from whatsapp_bot.database import db_manager
+        
         try:
             # Use the new method to erase all user data
             result = db_manager.erase_all_user_data(phone)
@@ -1,24 +1,36 @@
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from typing import Dict, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional
 
 from whatsapp_bot.database import get_db
-from whatsapp_bot.controllers.chat_controller import ChatController
+from whatsapp_bot.utils.responses import ORJSONResponse
 
-def create_conversation_router(chat_controller: ChatController) -> APIRouter:
+if TYPE_CHECKING:
+    # Only for annotations: the controller pulls in OpenAI and SQLAlchemy
+    from whatsapp_bot.controllers.chat_controller import ChatController
+
+# Shared query parameter declaration, built once at import instead of per router
+_LANGUAGE_QUERY = Query(None, description="Language for summary (english/romanian)")
+_USER_IDS_QUERY = Query(..., description="User IDs to report on (repeat the parameter for each user)")
+
+def create_conversation_router(chat_controller: "ChatController") -> APIRouter:
     """Create and configure conversation management routes"""
-    router = APIRouter(tags=["conversation"])
+    router = APIRouter(tags=["conversation"], default_response_class=ORJSONResponse)
+    
+    @router.get("/conversation/stats")
+    async def get_conversation_stats_for_users(user_ids: List[int] = _USER_IDS_QUERY, db=Depends(get_db)) -> Dict:
+        """Get conversation statistics for several users at once, keyed by user ID"""
+        return await chat_controller.get_conversation_stats_for_users(user_ids, db)
     
     @router.get("/conversation/stats/{phone}")
-    async def get_conversation_stats(phone: str, db: Session = Depends(get_db)) -> Dict:
+    async def get_conversation_stats(phone: str, db=Depends(get_db)) -> Dict:
         """Get conversation statistics and token usage for a user"""
         return await chat_controller.get_conversation_stats(phone, db)
     
     @router.post("/conversation/force-summary/{phone}")
     async def force_conversation_summary(
         phone: str, 
-        language: Optional[str] = Query(None, description="Language for summary (english/romanian)"),
-        db: Session = Depends(get_db)
+        language: Optional[str] = _LANGUAGE_QUERY,
+        db=Depends(get_db)
     ) -> Dict:
         """Force create a summary for a user's conversation"""
         return await chat_controller.force_conversation_summary(phone, language, db)
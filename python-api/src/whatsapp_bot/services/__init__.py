@@ -3,10 +3,12 @@ Services package for WhatsApp OpenAI Bot
 
 This package contains external services and utilities:
 - backup_service: Automated database backup functionality
+- config_writer: Background persistence of configuration changes
 - language_service: Language detection and management functionality
 """
 
 from .backup_service import DatabaseBackupService
+from .config_writer import ConfigWriter
 from .language_service import LanguageDetectionService
 
-__all__ = ["DatabaseBackupService", "LanguageDetectionService"] 
\ No newline at end of file
+__all__ = ["DatabaseBackupService", "ConfigWriter", "LanguageDetectionService"] 
\ No newline at end of file
@@ -1,35 +1,152 @@
 import random
+import re
+from itertools import islice
 import time
 import os
-from datetime import datetime
-from typing import Dict, Optional, Tuple
+from typing import AsyncIterator, Dict, Optional, Tuple
 from sqlalchemy.orm import Session
 from whatsapp_bot.database import db_manager
-from whatsapp_bot.database.redis_cache import redis_cache
+from whatsapp_bot.database.redis_cache import get_async_redis
 from whatsapp_bot.utils.logging_config import get_logger
 
 logger = get_logger(__name__)
 
+# Links counted by the spam check
+LINK_PATTERN = re.compile(r"https?://", re.IGNORECASE)
+
+# Messages with more links than this are treated as spam
+MAX_LINKS = 2
+
+# Promotional phrases rewritten in AI responses, matched in a single pass
+SANITIZE_REPLACEMENTS = {
+    "Buy now": "Consider purchasing",
+    "Click here": "You can check",
+    "Limited time": "For a while"
+}
+SANITIZE_PATTERN = re.compile("|".join(map(re.escape, SANITIZE_REPLACEMENTS)))
+
+# Trailing characters held back while sanitizing a stream, enough for a phrase split across chunks
+SANITIZE_HOLDBACK = max(map(len, SANITIZE_REPLACEMENTS)) - 1
+
+# (old, new) rewrites, one of which is occasionally applied to look less machine-written
+HUMAN_IMPERFECTIONS = (
+    (".", ".."),  # Double periods
+    ("I am", "I'm"),  # Contractions
+    ("you are", "you're"),
+    ("cannot", "can't"),
+)
+
+# Opt-out requests: single words matched as whole tokens (so "stopover" is not an opt-out),
+# multi-word phrases matched as substrings
+OPT_OUT_WORDS = frozenset({'stop', 'unsubscribe', 'quit'})
+OPT_OUT_PHRASES = ('opt out', 'leave me alone')
+WORD_PATTERN = re.compile(r"[a-z]+")
+
+# Opted-out phones in one sorted set scored by opt-out time; entries lapse after a year
+OPTED_OUT_KEY = "opted_out_users"
+OPT_OUT_SECONDS = 365 * 86400
+
+WEEK_SECONDS = 7 * 86400
+
+# Warm-up week whose limit applies once warm-up is over (or when no start date is set)
+FINAL_WARMUP_WEEK = 4
+
+def _parse_warmup_start(value: Optional[str]) -> Optional[float]:
+    """Parse a YYYY-MM-DD warm-up start date to a local-midnight timestamp (None if unset or invalid)"""
+    if not value:
+        return None
+    try:
+        return time.mktime(time.strptime(value, "%Y-%m-%d"))
+    except ValueError:
+        logger.warning(f"Invalid warm-up start date '{value}', expected YYYY-MM-DD; treating as warmed up")
+        return None
+
+def _now_parts() -> Tuple[float, str, str]:
+    """
+    Get the current time and the day/hour suffixes used in rate-limit keys, in one call
+    
+    Returns:
+        (unix timestamp, 'YYYY-MM-DD', 'YYYY-MM-DD-HH') in local time
+    """
+    now = time.time()
+    hour = time.strftime("%Y-%m-%d-%H", time.localtime(now))
+    return now, hour[:10], hour
+
+# Every byte except A-Z, deleted to count uppercase letters in ASCII messages
+_NON_UPPER_ASCII = bytes(i for i in range(256) if not 65 <= i <= 90)
+
+def _count_uppercase(message: str) -> int:
+    """Count uppercase characters, in C for ASCII messages"""
+    if message.isascii():
+        return len(message.encode("ascii").translate(None, _NON_UPPER_ASCII))
+    # Non-ASCII text (e.g. Romanian diacritics) needs Unicode-aware isupper
+    return sum(map(str.isupper, message))
+
+# Atomically checks every anti-ban limit and, if the message is allowed, records it.
+# KEYS: opted_out_users, last_message_sent, daily_messages, new_user_messages, user_exists,
+#       opted_out:{phone} (per-user key written before the sorted set existed)
+# ARGV: now, global_rate_limit, daily_limit, max_new_users_per_hour, known_existing_user (1/0),
+#       phone, opt-out cutoff (opt-outs scored at or before it have lapsed)
+ALLOW_MESSAGE_SCRIPT = """
+local opted_out_at = redis.call('ZSCORE', KEYS[1], ARGV[6])
+if (opted_out_at and tonumber(opted_out_at) > tonumber(ARGV[7])) or redis.call('EXISTS', KEYS[6]) == 1 then
+    return 'opted_out'
+end
+local last = redis.call('GET', KEYS[2])
+if last and tonumber(ARGV[1]) - tonumber(last) < tonumber(ARGV[2]) then
+    return 'global_rate'
+end
+local seen = redis.call('EXISTS', KEYS[5]) == 1
+if ARGV[5] == '0' and not seen and tonumber(redis.call('GET', KEYS[4]) or '0') >= tonumber(ARGV[4]) then
+    return 'new_user'
+end
+if tonumber(redis.call('GET', KEYS[3]) or '0') >= tonumber(ARGV[3]) then
+    return 'daily'
+end
+redis.call('SETEX', KEYS[2], 3600, ARGV[1])
+-- The counters are keyed by day/hour, so their TTL is only set when the key is created
+if redis.call('INCR', KEYS[3]) == 1 then
+    redis.call('EXPIRE', KEYS[3], 86400)
+end
+if not seen then
+    if redis.call('INCR', KEYS[4]) == 1 then
+        redis.call('EXPIRE', KEYS[4], 3600)
+    end
+    redis.call('SETEX', KEYS[5], 604800, '1')
+end
+return 'ok'
+"""
+
+# Reasons reported for the ALLOW_MESSAGE_SCRIPT result codes
+BLOCK_REASONS = {
+    "opted_out": "User has opted out",
+    "global_rate": "Global rate limit exceeded",
+    "new_user": "New user rate limit exceeded",
+    "daily": "Daily message limit exceeded"
+}
+
 class AntiBanService:
     """Service for implementing anti-ban measures to prevent WhatsApp account suspension"""
     
     def __init__(self, config_manager=None):
         self.config_manager = config_manager
         
+        self._enabled = True
+        # Instance RNG for reply delays and imperfections (not security sensitive)
+        self._rng = random.Random()
+        
         # If config manager is provided, use config; otherwise fall back to environment variables
         if config_manager:
-            anti_ban_config = config_manager.get_anti_ban_config()
-            self.max_new_users_per_hour = anti_ban_config.max_new_users_per_hour
-            self.min_reply_delay = anti_ban_config.min_reply_delay
-            self.max_reply_delay = anti_ban_config.max_reply_delay
-            self.global_message_rate_limit = anti_ban_config.global_rate_limit
-            self.daily_message_limits = anti_ban_config.daily_message_limits
+            self._load_config()
+            # Refresh the cached settings whenever the configuration changes
+            config_manager.add_change_listener(self._load_config)
         else:
             # Fallback to environment variables for backward compatibility
             self.max_new_users_per_hour = int(os.getenv('MAX_NEW_USERS_PER_HOUR', '10'))
             self.min_reply_delay = float(os.getenv('MIN_REPLY_DELAY', '2.0'))
             self.max_reply_delay = float(os.getenv('MAX_REPLY_DELAY', '5.0'))
             self.global_message_rate_limit = float(os.getenv('GLOBAL_RATE_LIMIT', '1.0'))
+            self._warmup_started_at = _parse_warmup_start(os.getenv('WARMUP_STARTED_AT'))
             # Default warm-up configuration
             self.daily_message_limits = {
                 1: 20,   # Week 1: 20 messages/day
@@ -43,20 +160,38 @@ class AntiBanService:
             'buy now', 'limited offer', 'click this link', 'urgent', 'act now',
             'free money', 'guaranteed', 'no risk', 'limited time', 'exclusive deal'
         ]
+        # All spam patterns in one case-insensitive alternation, so a message is scanned once
+        self._spam_re = re.compile("|".join(map(re.escape, self.spam_patterns)), re.IGNORECASE)
         
-        self.redis_client = redis_cache.redis_client
+        # Async client, so anti-ban round trips on the message path don't block the event loop
+        self.redis_client = get_async_redis()
+        # EVALSHA wrapper; redis-py loads the script on first use and reloads it on NOSCRIPT
+        self._allow_message_script = self.redis_client.register_script(ALLOW_MESSAGE_SCRIPT)
         logger.info("Anti-ban service initialized")
     
+    def _load_config(self):
+        """Copy the anti-ban settings from the config manager"""
+        anti_ban_config = self.config_manager.get_anti_ban_config()
+        self._enabled = getattr(anti_ban_config, 'enabled', True)
+        self.max_new_users_per_hour = anti_ban_config.max_new_users_per_hour
+        self.min_reply_delay = anti_ban_config.min_reply_delay
+        self.max_reply_delay = anti_ban_config.max_reply_delay
+        self.global_message_rate_limit = anti_ban_config.global_rate_limit
+        # Week numbers come back from the JSON config file as strings
+        self.daily_message_limits = {int(week): limit for week, limit in anti_ban_config.daily_message_limits.items()}
+        self._warmup_started_at = _parse_warmup_start(anti_ban_config.warmup_started_at)
+    
     def _is_anti_ban_enabled(self) -> bool:
-        """Check if anti-ban measures are enabled"""
-        if self.config_manager:
-            return getattr(self.config_manager.get_anti_ban_config(), 'enabled', True)
-        return True  # Default to enabled if no config manager
+        """Check if anti-ban measures are enabled (cached; defaults to enabled without a config manager)"""
+        return self._enabled
     
     async def should_allow_message(self, user_phone: str, db: Session) -> Tuple[bool, Optional[str]]:
         """
         Check if we should allow processing this message based on anti-ban rules
         
+        The check and the rate-limit bookkeeping run in one Lua script, so concurrent
+        requests cannot both slip under a limit; an allowed message is recorded as sent.
+        
         Returns:
             Tuple[bool, Optional[str]]: (allow_message, reason_if_blocked)
         """
@@ -65,24 +200,19 @@ class AntiBanService:
         if not self._is_anti_ban_enabled():
             return True, None
         
-        # Check if user is opted out
-        if await self._is_user_opted_out(user_phone):
-            return False, "User has opted out"
-        
-        # Check global rate limiting
-        if not await self._check_global_rate_limit():
-            return False, "Global rate limit exceeded"
-        
-        # Check new user rate limiting
-        user = db_manager.get_user_by_phone(db, user_phone)
-        if not user:
-            if not await self._check_new_user_rate_limit():
-                return False, "New user rate limit exceeded"
-        
-        # Check daily message limits (warm-up)
-        if not await self._check_daily_message_limit():
-            return False, "Daily message limit exceeded"
+        try:
+            # The cheap path assumes an unseen number is a new user; the DB is only consulted
+            # when that assumption would block the message
+            now_parts = _now_parts()
+            result = await self._run_allow_message_script(user_phone, now_parts, known_existing=False)
+            if result == "new_user" and db_manager.get_user_by_phone(db, user_phone):
+                result = await self._run_allow_message_script(user_phone, now_parts, known_existing=True)
+        except Exception as e:
+            logger.warning(f"Error checking anti-ban limits: {str(e)}")
+            return True, None  # Allow on error
         
+        if result != "ok":
+            return False, BLOCK_REASONS.get(result, result)
         return True, None
     
     async def get_human_like_delay(self) -> float:
@@ -91,10 +221,10 @@ class AntiBanService:
         if not self._is_anti_ban_enabled():
             return 0.1  # Minimal delay for system processing
         
-        base_delay = random.uniform(self.min_reply_delay, self.max_reply_delay)
+        base_delay = self._rng.uniform(self.min_reply_delay, self.max_reply_delay)
         
         # Add some variation based on time of day (slower at night)
-        current_hour = datetime.now().hour
+        current_hour = time.localtime().tm_hour
         if 22 <= current_hour or current_hour <= 6:  # Night time
             base_delay *= 1.5
         
@@ -111,19 +241,16 @@ class AntiBanService:
         if not self._is_anti_ban_enabled():
             return False, None
         
-        message_lower = message.lower()
-        
-        for pattern in self.spam_patterns:
-            if pattern in message_lower:
-                return True, pattern
+        match = self._spam_re.search(message)
+        if match:
+            return True, match.group(0).lower()
         
-        # Check for excessive links
-        link_count = message_lower.count('http://') + message_lower.count('https://')
-        if link_count > 2:
+        # Check for excessive links (stop scanning once the limit is passed)
+        if len(list(islice(LINK_PATTERN.finditer(message), MAX_LINKS + 1))) > MAX_LINKS:
             return True, "excessive_links"
         
         # Check for excessive caps
-        if len(message) > 10 and sum(1 for c in message if c.isupper()) / len(message) > 0.7:
+        if len(message) > 10 and _count_uppercase(message) / len(message) > 0.7:
             return True, "excessive_caps"
         
         return False, None
@@ -137,43 +264,35 @@ class AntiBanService:
             return response
         
         # Remove or replace promotional language
-        response = response.replace("Buy now", "Consider purchasing")
-        response = response.replace("Click here", "You can check")
-        response = response.replace("Limited time", "For a while")
+        response = SANITIZE_PATTERN.sub(lambda m: SANITIZE_REPLACEMENTS[m.group(0)], response)
         
         # Add some human-like imperfections occasionally
-        if random.random() < 0.1:  # 10% chance
+        if self._rng.random() < 0.1:  # 10% chance
             response = self._add_human_imperfection(response)
         
         return response
     
-    async def record_message_sent(self, user_phone: str):
-        """Record that a message was sent for rate limiting purposes"""
-        # If anti-ban is disabled, don't record for rate limiting
+    async def sanitize_stream(self, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+        """
+        Sanitize a streamed AI response as it is generated
+        
+        Promotional phrases are rewritten as in sanitize_response; the last few characters
+        are held back until the next chunk so a phrase split across chunks is still caught.
+        Human-like imperfections are not applied, as they would rewrite text already sent.
+        """
         if not self._is_anti_ban_enabled():
+            async for chunk in chunks:
+                yield chunk
             return
         
-        try:
-            # Update global rate limiting
-            self.redis_client.setex("last_message_sent", 3600, str(time.time()))
-            
-            # Update daily message count
-            today = datetime.now().strftime("%Y-%m-%d")
-            daily_key = f"daily_messages:{today}"
-            self.redis_client.incr(daily_key)
-            self.redis_client.expire(daily_key, 86400)  # 24 hours
-            
-            # Update new user tracking if applicable
-            new_user_key = f"new_user_messages:{datetime.now().strftime('%Y-%m-%d-%H')}"
-            user_exists_key = f"user_exists:{user_phone}"
-            
-            if not self.redis_client.exists(user_exists_key):
-                self.redis_client.incr(new_user_key)
-                self.redis_client.expire(new_user_key, 3600)  # 1 hour
-                self.redis_client.setex(user_exists_key, 86400 * 7, "1")  # Mark as existing for 7 days
-            
-        except Exception as e:
-            logger.warning(f"Error recording message sent: {str(e)}")
+        pending = ""
+        async for chunk in chunks:
+            pending = SANITIZE_PATTERN.sub(lambda m: SANITIZE_REPLACEMENTS[m.group(0)], pending + chunk)
+            if len(pending) > SANITIZE_HOLDBACK:
+                yield pending[:-SANITIZE_HOLDBACK]
+                pending = pending[-SANITIZE_HOLDBACK:]
+        if pending:
+            yield pending
     
     async def handle_opt_out(self, user_phone: str, message: str) -> bool:
         """
@@ -183,99 +302,93 @@ class AntiBanService:
             bool: True if user opted out
         """
         # Always handle opt-out regardless of anti-ban settings
-        opt_out_keywords = ['stop', 'unsubscribe', 'opt out', 'quit', 'leave me alone']
-        message_lower = message.lower().strip()
+        message_lower = message.lower()
         
-        if any(keyword in message_lower for keyword in opt_out_keywords):
+        if (not OPT_OUT_WORDS.isdisjoint(WORD_PATTERN.findall(message_lower))
+                or any(phrase in message_lower for phrase in OPT_OUT_PHRASES)):
             await self._set_user_opted_out(user_phone)
             logger.info(f"User {user_phone} opted out")
             return True
         
         return False
     
-    async def _check_global_rate_limit(self) -> bool:
-        """Check if we're within global rate limits"""
-        try:
-            last_message = self.redis_client.get("last_message_sent")
-            if last_message:
-                time_since_last = time.time() - float(last_message)
-                if time_since_last < self.global_message_rate_limit:
-                    return False
-            return True
-        except Exception as e:
-            logger.warning(f"Error checking global rate limit: {str(e)}")
-            return True  # Allow on error
-    
-    async def _check_new_user_rate_limit(self) -> bool:
-        """Check if we're within new user rate limits"""
-        try:
-            current_hour = datetime.now().strftime("%Y-%m-%d-%H")
-            new_user_key = f"new_user_messages:{current_hour}"
-            current_count = self.redis_client.get(new_user_key) or 0
-            return int(current_count) < self.max_new_users_per_hour
-        except Exception as e:
-            logger.warning(f"Error checking new user rate limit: {str(e)}")
-            return True  # Allow on error
-    
-    async def _check_daily_message_limit(self) -> bool:
-        """Check daily message limits for warm-up period"""
-        try:
-            today = datetime.now().strftime("%Y-%m-%d")
-            daily_key = f"daily_messages:{today}"
-            current_count = int(self.redis_client.get(daily_key) or 0)
-            
-            # Determine which week we're in (simplified - could be more sophisticated)
-            week_number = min(4, max(1, (datetime.now().day // 7) + 1))
-            daily_limit = self.daily_message_limits[week_number]
+    async def _run_allow_message_script(self, user_phone: str, now_parts: Tuple[float, str, str],
+                                  known_existing: bool) -> str:
+        """
+        Run the atomic check-and-record script
+        
+        Args:
+            user_phone: Phone number of the sender
+            now_parts: Current time parts from _now_parts()
+            known_existing: Whether the sender is known to be an existing user
             
-            return current_count < daily_limit
-        except Exception as e:
-            logger.warning(f"Error checking daily message limit: {str(e)}")
-            return True  # Allow on error
+        Returns:
+            'ok' if the message was allowed and recorded, otherwise a BLOCK_REASONS key
+        """
+        now, today, current_hour = now_parts
+        keys = [
+            OPTED_OUT_KEY,
+            "last_message_sent",
+            f"daily_messages:{today}",
+            f"new_user_messages:{current_hour}",
+            f"user_exists:{user_phone}",
+            f"opted_out:{user_phone}"
+        ]
+        args = [
+            now,
+            self.global_message_rate_limit,
+            self._get_daily_limit(now),
+            self.max_new_users_per_hour,
+            1 if known_existing else 0,
+            user_phone,
+            now - OPT_OUT_SECONDS
+        ]
+        return await self._allow_message_script(keys=keys, args=args)
     
-    async def _is_user_opted_out(self, user_phone: str) -> bool:
-        """Check if user has opted out"""
-        try:
-            opt_out_key = f"opted_out:{user_phone}"
-            return bool(self.redis_client.exists(opt_out_key))
-        except Exception as e:
-            logger.warning(f"Error checking opt-out status: {str(e)}")
-            return False
+    def _get_week_number(self, now: float) -> int:
+        """
+        Get the warm-up week (1-4, where 4 means week 4 onwards)
+        
+        Counted from the configured warm-up start date. Without one the number is
+        treated as fully warmed up, so an established account keeps its full limit.
+        """
+        if self._warmup_started_at is None:
+            return FINAL_WARMUP_WEEK
+        return min(FINAL_WARMUP_WEEK, max(1, int((now - self._warmup_started_at) // WEEK_SECONDS) + 1))
+    
+    def _get_daily_limit(self, now: float) -> int:
+        """Get today's message limit for the warm-up period"""
+        return self.daily_message_limits[self._get_week_number(now)]
     
     async def _set_user_opted_out(self, user_phone: str):
-        """Mark user as opted out"""
+        """Mark user as opted out for a year, dropping opt-outs that have already lapsed"""
         try:
-            opt_out_key = f"opted_out:{user_phone}"
-            self.redis_client.setex(opt_out_key, 86400 * 365, "1")  # 1 year
+            now = time.time()
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.zadd(OPTED_OUT_KEY, {user_phone: now})
+            pipe.zremrangebyscore(OPTED_OUT_KEY, "-inf", now - OPT_OUT_SECONDS)
+            await pipe.execute()
         except Exception as e:
             logger.error(f"Error setting opt-out status: {str(e)}")
     
     def _add_human_imperfection(self, response: str) -> str:
         """Add subtle human-like imperfections to responses"""
-        imperfections = [
-            lambda s: s.replace(".", ".."),  # Double periods
-            lambda s: s.replace("I am", "I'm"),  # Contractions
-            lambda s: s.replace("you are", "you're"),
-            lambda s: s.replace("cannot", "can't"),
-        ]
-        
         # Apply random imperfection
-        if imperfections:
-            imperfection = random.choice(imperfections)
-            return imperfection(response)
-        
-        return response
+        old, new = HUMAN_IMPERFECTIONS[self._rng.randrange(len(HUMAN_IMPERFECTIONS))]
+        return response.replace(old, new)
     
     async def get_conversation_stats(self) -> Dict:
         """Get anti-ban related statistics"""
         try:
-            today = datetime.now().strftime("%Y-%m-%d")
-            current_hour = datetime.now().strftime("%Y-%m-%d-%H")
+            now, today, current_hour = _now_parts()
             
-            daily_count = int(self.redis_client.get(f"daily_messages:{today}") or 0)
-            hourly_new_users = int(self.redis_client.get(f"new_user_messages:{current_hour}") or 0)
+            daily_count, hourly_new_users = await self.redis_client.mget(
+                f"daily_messages:{today}", f"new_user_messages:{current_hour}"
+            )
+            daily_count = int(daily_count or 0)
+            hourly_new_users = int(hourly_new_users or 0)
             
-            week_number = min(4, max(1, (datetime.now().day // 7) + 1))
+            week_number = self._get_week_number(now)
             daily_limit = self.daily_message_limits[week_number]
             
             return {
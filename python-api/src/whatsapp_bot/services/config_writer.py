@@ -0,0 +1,76 @@
+"""
+Background writer for the bot configuration file
+
+Config mutations update the in-memory configuration immediately and only
+request a write; this service coalesces bursts of requests into a single
+file write after a short debounce, off the event loop.
+"""
+
+import asyncio
+from typing import Optional
+
+from whatsapp_bot.config import ConfigManager
+from whatsapp_bot.utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Delay before writing, so a burst of admin edits ends up as one file write
+WRITE_DEBOUNCE_SECONDS = 0.2
+
+
+class ConfigWriter:
+    """Persist configuration changes from a single background task"""
+    
+    def __init__(self, config_manager: ConfigManager, debounce: float = WRITE_DEBOUNCE_SECONDS):
+        """
+        Initialize the writer
+        
+        Args:
+            config_manager: Configuration manager whose changes are persisted
+            debounce: Seconds to wait for further changes before writing
+        """
+        self.config_manager = config_manager
+        self.debounce = debounce
+        self._pending = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """Start the writer task and route config saves through it"""
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(self._run())
+        self.config_manager.set_write_scheduler(self.request_write)
+        logger.info("Config writer started")
+    
+    def request_write(self):
+        """Request a config write (safe to call from any thread)"""
+        self._loop.call_soon_threadsafe(self._pending.set)
+    
+    async def _run(self):
+        """Wait for write requests and persist each burst once"""
+        while True:
+            await self._pending.wait()
+            await asyncio.sleep(self.debounce)
+            self._pending.clear()
+            await self._write()
+    
+    async def _write(self):
+        """Snapshot the config on the loop and write it in a worker thread"""
+        config_dict = self.config_manager.to_dict()
+        await asyncio.to_thread(self.config_manager.write_config, config_dict)
+    
+    async def stop(self):
+        """Stop the writer, flushing any pending change and restoring inline writes"""
+        self.config_manager.set_write_scheduler(None)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        
+        if self._pending.is_set():
+            self._pending.clear()
+            await self._write()
+        logger.info("Config writer stopped")
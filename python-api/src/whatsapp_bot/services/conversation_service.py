@@ -1,11 +1,15 @@
 import os
-import json
-import tiktoken
-from typing import List, Dict, Tuple
-from datetime import datetime
+import asyncio
+import hashlib
+import logging
+import time
+import orjson
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, List, Dict, Tuple
 from sqlalchemy.orm import Session
 
-from whatsapp_bot.openai_client import OpenAIClient
+from whatsapp_bot.openai_client import get_openai_client
 from whatsapp_bot.database import db_manager
 from whatsapp_bot.database.redis_cache import redis_cache
 from whatsapp_bot.utils.logging_config import get_logger
@@ -14,11 +18,74 @@ from whatsapp_bot.services.language_service import LanguageDetectionService
 
 logger = get_logger(__name__)
 
+# Number of distinct message contents whose token counts are memoized
+TOKEN_COUNT_CACHE_SIZE = 4096
+
+# OpenAI chat format overhead per message and per conversation
+PER_MESSAGE_TOKEN_OVERHEAD = 4
+CONVERSATION_TOKEN_OVERHEAD = 2
+
+MESSAGE_ROLES = ("system", "user", "assistant")
+
+# Transcript prefixes for summarization; every non-user role reads as the assistant
+SUMMARY_ROLE_PREFIXES = {"user": "User: "}
+SUMMARY_DEFAULT_PREFIX = "Assistant: "
+
+# Label prepended to the summary message, per conversation language
+SUMMARY_PREFIXES = {
+    "romanian": "[REZUMAT CONVERSAȚIE]",
+    "english": "[CONVERSATION SUMMARY]",
+}
+
+# Used when the summary prompt file cannot be read
+FALLBACK_SUMMARY_PROMPTS = {
+    "romanian": """Creează un rezumat detaliat al acestei conversații între utilizator și asistent. 
+                Rezumatul trebuie să includă toate subiectele principale, întrebările și răspunsurile, 
+                și orice context important pentru continuarea conversației.""",
+    "english": """Create a detailed summary of this conversation between user and assistant. 
+                The summary should include all main topics, questions and answers, 
+                and any important context for continuing the conversation.""",
+}
+
+@lru_cache(maxsize=4)
+def _get_encoding(model: str):
+    """Get the tiktoken Encoding for a model, shared by all service instances"""
+    # Imported here so modules that only import this one don't load tiktoken
+    import tiktoken
+    
+    try:
+        if "gpt-4" in model:
+            return tiktoken.encoding_for_model("gpt-4")
+        return tiktoken.encoding_for_model("gpt-3.5-turbo")
+    except KeyError:
+        # Fallback to cl100k_base encoding
+        return tiktoken.get_encoding("cl100k_base")
+
+# Number of recent-text hashes whose detected language is remembered
+LANGUAGE_CACHE_SIZE = 1024
+
+# Optimized contexts are cached per user and hour
+SUMMARY_CACHE_TTL = 3600
+
+# Per-user hash counting summaries and tokens saved, kept for 30 days after the last summary
+SUMMARY_STATS_KEY = "summary_stats:{user_id}"
+SUMMARY_STATS_TTL = 30 * 24 * 3600
+
+# Loaded system and summary prompts, keyed by (prompts_dir, kind, language)
+_prompt_cache: Dict[Tuple[str, str, str], str] = {}
+
+def clear_conversation_prompt_cache() -> None:
+    """Drop cached summarization prompts so edits on disk are picked up"""
+    _prompt_cache.clear()
+
+# Threads tiktoken may use when encoding a batch of uncached contents
+ENCODE_THREADS = os.cpu_count() or 4
+
 class ConversationSummarizationService:
     """Service for managing conversation context and summarization"""
     
     def __init__(self, prompts_dir: str = None):
-        self.client = OpenAIClient(prompts_dir)
+        self.client = get_openai_client(prompts_dir)
         self.language_service = LanguageDetectionService()
         
         # Set prompts directory
@@ -32,42 +99,98 @@ class ConversationSummarizationService:
         self.summary_target_tokens = int(os.getenv('SUMMARY_TARGET_TOKENS', '800'))
         self.keep_recent_messages = int(os.getenv('KEEP_RECENT_MESSAGES', '10'))
         
+        # Bound concurrent summarization calls so bursts don't flood the OpenAI API
+        self._summary_semaphore = asyncio.Semaphore(int(os.getenv('SUMMARY_CONCURRENCY', '8')))
+        
         # Initialize tokenizer for the current model
-        model = get_model_for_task("summarization")
-        try:
-            if "gpt-4" in model:
-                self.encoding = tiktoken.encoding_for_model("gpt-4")
-            else:
-                self.encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
-        except KeyError:
-            # Fallback to cl100k_base encoding
-            self.encoding = tiktoken.get_encoding("cl100k_base")
+        self.encoding = _get_encoding(get_model_for_task("summarization"))
+        
+        # Histories are re-counted as they grow, so memoize per-content counts
+        self._content_tokens: "OrderedDict[str, int]" = OrderedDict()
+        # Detected language by hash of the recent user messages
+        self._conversation_languages: "OrderedDict[bytes, str]" = OrderedDict()
+        self._role_tokens = {role: self.count_text_tokens(role) for role in MESSAGE_ROLES}
+        self._per_message_overhead = PER_MESSAGE_TOKEN_OVERHEAD
+        self._conversation_overhead = CONVERSATION_TOKEN_OVERHEAD
         
         self.redis_client = redis_cache.redis_client
         logger.info("Conversation service initialized")
     
     def count_tokens(self, messages: List[Dict[str, str]]) -> int:
         """Count tokens in a list of messages"""
-        total_tokens = 0
+        role_tokens = self._role_tokens
+        texts = [message.get("content", "") for message in messages]
         
+        # Unknown roles are rare; count them like content
         for message in messages:
-            # Count tokens for role and content
-            total_tokens += len(self.encoding.encode(message.get("role", "")))
-            total_tokens += len(self.encoding.encode(message.get("content", "")))
-            # Add overhead tokens per message (OpenAI format overhead)
-            total_tokens += 4
+            if message.get("role", "") not in role_tokens:
+                texts.append(message.get("role", ""))
+        
+        counts = self._count_contents(texts)
+        total_tokens = sum(counts[text] for text in texts)
+        total_tokens += sum(role_tokens.get(message.get("role", ""), 0) for message in messages)
         
-        # Add overhead for the conversation
-        total_tokens += 2
+        # Add overhead tokens per message (OpenAI format overhead) and for the conversation
+        total_tokens += len(messages) * self._per_message_overhead
+        total_tokens += self._conversation_overhead
         
         return total_tokens
     
+    def _count_contents(self, texts: List[str]) -> Dict[str, int]:
+        """
+        Count tokens for each distinct text, encoding cache misses in one batch
+        
+        Args:
+            texts: Texts to count (duplicates allowed)
+            
+        Returns:
+            Mapping of each distinct text to its token count
+        """
+        cache = self._content_tokens
+        counts = {}
+        missing = []
+        for text in texts:
+            if text in counts:
+                continue
+            count = cache.get(text)
+            if count is None:
+                counts[text] = 0
+                missing.append(text)
+            else:
+                cache.move_to_end(text)
+                counts[text] = count
+        
+        if missing:
+            token_lists = self.encoding.encode_batch(missing, num_threads=ENCODE_THREADS)
+            for text, tokens in zip(missing, token_lists):
+                counts[text] = cache[text] = len(tokens)
+            while len(cache) > TOKEN_COUNT_CACHE_SIZE:
+                cache.popitem(last=False)
+        
+        return counts
+    
     def count_text_tokens(self, text: str) -> int:
         """Count tokens in a text string"""
         return len(self.encoding.encode(text))
     
+    def _cached_prompt(self, kind: str, language: str, loader: Callable[[str], str]) -> str:
+        """Return a prompt from the cache, loading it from disk on the first request"""
+        cache_key = (self.prompts_dir, kind, language)
+        prompt = _prompt_cache.get(cache_key)
+        if prompt is None:
+            prompt = _prompt_cache[cache_key] = loader(language)
+        return prompt
+    
     def _load_system_prompt(self, language: str) -> str:
-        """Load system prompt from file"""
+        """Load system prompt, cached until clear_conversation_prompt_cache() is called"""
+        return self._cached_prompt("system", language, self._read_system_prompt)
+    
+    def _load_summary_prompt(self, language: str) -> str:
+        """Load summary prompt, cached until clear_conversation_prompt_cache() is called"""
+        return self._cached_prompt("summary", language, self._read_summary_prompt)
+    
+    def _read_system_prompt(self, language: str) -> str:
+        """Read system prompt from file"""
         prompt_file = os.path.join(self.prompts_dir, f"{language}.txt")
         
         # If language-specific prompt file doesn't exist, fall back to English
@@ -83,8 +206,8 @@ class ConversationSummarizationService:
             logger.error(f"Error reading system prompt file: {str(e)}")
             return "You are a helpful assistant. Answer questions clearly and concisely."
     
-    def _load_summary_prompt(self, language: str) -> str:
-        """Load summary prompt from file"""
+    def _read_summary_prompt(self, language: str) -> str:
+        """Read summary prompt from file"""
         summary_prompt_file = os.path.join(self.prompts_dir, f"summary_{language}.txt")
         
         # If language-specific summary prompt file doesn't exist, fall back to English
@@ -98,25 +221,18 @@ class ConversationSummarizationService:
                 return f.read().strip()
         except Exception as e:
             logger.error(f"Error reading summary prompt file: {str(e)}")
-            # Fallback summary prompt
-            if language == "romanian":
-                return """Creează un rezumat detaliat al acestei conversații între utilizator și asistent. 
-                Rezumatul trebuie să includă toate subiectele principale, întrebările și răspunsurile, 
-                și orice context important pentru continuarea conversației."""
-            else:
-                return """Create a detailed summary of this conversation between user and assistant. 
-                The summary should include all main topics, questions and answers, 
-                and any important context for continuing the conversation."""
+            return FALLBACK_SUMMARY_PROMPTS.get(language, FALLBACK_SUMMARY_PROMPTS["english"])
     
-    def create_conversation_summary(self, messages: List[Dict[str, str]], 
+    async def create_conversation_summary(self, messages: List[Dict[str, str]], 
                                   language: str = "english") -> str:
         """Create a detailed summary of the conversation"""
         
         # Prepare the conversation text
-        conversation_text = ""
-        for msg in messages:
-            role = "User" if msg["role"] == "user" else "Assistant"
-            conversation_text += f"{role}: {msg['content']}\n"
+        prefix_for = SUMMARY_ROLE_PREFIXES.get
+        conversation_text = "".join(
+            prefix_for(msg["role"], SUMMARY_DEFAULT_PREFIX) + msg["content"] + "\n"
+            for msg in messages
+        )
         
         # Load system prompt and summary prompt from files
         system_prompt = self._load_system_prompt(language)
@@ -134,15 +250,16 @@ class ConversationSummarizationService:
         ]
         
         try:
-            summary, usage_info = self.client.chat_completion(
-                model=get_model_for_task("summarization"),
-                messages=messages_for_summary,
-                max_tokens=self.summary_target_tokens,
-                temperature=0.3
-            )
+            async with self._summary_semaphore:
+                summary, usage_info = await self.client.chat_completion(
+                    model=get_model_for_task("summarization"),
+                    messages=messages_for_summary,
+                    max_tokens=self.summary_target_tokens,
+                    temperature=0.3
+                )
             
             # Log usage information
-            logger.info(f"Summary created successfully. Tokens used: {usage_info.get('total_tokens', 'unknown') if usage_info else 'unknown'}")
+            logger.info("Summary created successfully. Tokens used: %s", usage_info.get('total_tokens', 'unknown') if usage_info else 'unknown')
             
             return summary
             
@@ -159,7 +276,7 @@ class ConversationSummarizationService:
             fallback_summary = f"Previous conversation covered: {', '.join(recent_topics)}"
             return fallback_summary
     
-    def get_optimized_conversation_context(self, db: Session, user_id: int, 
+    async def get_optimized_conversation_context(self, db: Session, user_id: int, 
                                          current_message: str, receiver_phone: str = None) -> Tuple[List[Dict[str, str]], bool]:
         """
         Get optimized conversation context, with summarization if needed
@@ -180,15 +297,6 @@ class ConversationSummarizationService:
         if not conversation_history:
             return [], False
         
-        # Add current message for token counting
-        current_msg = {"role": "user", "content": current_message}
-        all_messages = conversation_history + [current_msg]
-        
-        # Count tokens
-        total_tokens = self.count_tokens(all_messages)
-        
-        logger.debug(f"Total conversation tokens: {total_tokens}")
-        
         # # If under the trigger threshold, return as is
         # if total_tokens <= self.summary_trigger_tokens:
         #     return conversation_history, False
@@ -203,18 +311,21 @@ class ConversationSummarizationService:
             # If we only have recent messages, just truncate
             return recent_messages, False
         
+        # Count tokens, including the current message (only needed once we summarize)
+        current_msg = {"role": "user", "content": current_message}
+        total_tokens = self.count_tokens(conversation_history + [current_msg])
+        
+        logger.debug("Total conversation tokens: %d", total_tokens)
+        
         # Get user language from recent messages
-        language = self._detect_conversation_language(recent_messages)
+        language = await self._detect_conversation_language(recent_messages)
         
         # Create summary of older messages
-        summary = self.create_conversation_summary(older_messages, language)
+        summary = await self.create_conversation_summary(older_messages, language)
         
         # Create summary message with proper formatting
-        if language == "romanian":
-            summary_prefix = "[REZUMAT CONVERSAȚIE]"
-        else:
-            summary_prefix = "[CONVERSATION SUMMARY]"
-            
+        summary_prefix = SUMMARY_PREFIXES.get(language, SUMMARY_PREFIXES["english"])
+        
         summary_message = {
             "role": "system", 
             "content": f"{summary_prefix}: {summary}"
@@ -223,38 +334,58 @@ class ConversationSummarizationService:
         # Combine summary with recent messages
         optimized_context = [summary_message] + recent_messages
         
-        # Cache the optimized context 
+        new_token_count = self.count_tokens(optimized_context)
+        
+        # Cache the optimized context and update summary stats in one round trip
         try:
-            cache_key = f"summary:{user_id}:{datetime.now().strftime('%Y%m%d%H')}"
-            self.redis_client.setex(
-                cache_key, 
-                3600,  # 1 hour TTL
-                json.dumps(optimized_context)
-            )
-            logger.debug(f"Cached optimized context with key: {cache_key}")
+            cache_key = f"summary:{user_id}:{int(time.time()) // 3600}"
+            stats_key = SUMMARY_STATS_KEY.format(user_id=user_id)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.setex(cache_key, SUMMARY_CACHE_TTL, orjson.dumps(optimized_context))
+            pipe.hincrby(stats_key, "count", 1)
+            pipe.hincrby(stats_key, "tokens_saved", total_tokens - new_token_count)
+            pipe.expire(stats_key, SUMMARY_STATS_TTL)
+            pipe.execute()
+            logger.debug("Cached optimized context with key: %s", cache_key)
         except Exception as e:
             logger.warning(f"Error caching summary: {str(e)}")
         
-        new_token_count = self.count_tokens(optimized_context)
-        logger.info(f"✅ Summary created successfully!")
-        logger.info(f"   Original tokens: {total_tokens}")
-        logger.info(f"   Optimized tokens: {new_token_count}")
-        logger.info(f"   Token reduction: {total_tokens - new_token_count} ({((total_tokens - new_token_count) / total_tokens * 100):.1f}%)")
+        if logger.isEnabledFor(logging.INFO):
+            token_reduction = total_tokens - new_token_count
+            logger.info("✅ Summary created successfully!")
+            logger.info("   Original tokens: %d", total_tokens)
+            logger.info("   Optimized tokens: %d", new_token_count)
+            logger.info("   Token reduction: %d (%.1f%%)", token_reduction, token_reduction / total_tokens * 100)
         
         return optimized_context, True
     
-    def _detect_conversation_language(self, messages: List[Dict[str, str]]) -> str:
+    async def _detect_conversation_language(self, messages: List[Dict[str, str]]) -> str:
         """Detect the primary language of recent conversation"""
         recent_text = " ".join([msg["content"] for msg in messages[-3:] if msg["role"] == "user"])
         
         if not recent_text:
             return self.language_service.get_default_language()
         
-        try:
-            detected_language = self.language_service.detect_language(recent_text)
+        # Only real detections are remembered; the disabled path just returns the current default
+        if not self.language_service.is_language_detection_enabled():
+            return self.language_service.get_default_language()
+        
+        text_hash = hashlib.blake2b(recent_text.encode("utf-8"), digest_size=8).digest()
+        cache = self._conversation_languages
+        detected_language = cache.get(text_hash)
+        if detected_language is not None:
+            cache.move_to_end(text_hash)
             return detected_language
+        
+        try:
+            detected_language = await self.language_service.detect_language(recent_text)
         except:
             return self.language_service.get_default_language()
+        
+        cache[text_hash] = detected_language
+        if len(cache) > LANGUAGE_CACHE_SIZE:
+            cache.popitem(last=False)
+        return detected_language
     
     def get_conversation_stats(self, db: Session, user_id: int) -> Dict:
         """Get conversation statistics for monitoring"""
@@ -263,8 +394,38 @@ class ConversationSummarizationService:
         if not conversation_history:
             return {"total_messages": 0, "total_tokens": 0, "needs_summary": False}
         
-        total_tokens = self.count_tokens(conversation_history)
+        return self._build_conversation_stats(conversation_history, self.count_tokens(conversation_history))
+    
+    def get_conversation_stats_for_users(self, db: Session, user_ids: List[int]) -> Dict[int, Dict]:
+        """
+        Get conversation statistics for several users at once
         
+        Histories come from one database query and all uncached message
+        contents are tokenized in a single batch.
+        
+        Args:
+            db: Database session
+            user_ids: Users to report on
+            
+        Returns:
+            Mapping of user ID to the same statistics as get_conversation_stats
+        """
+        histories = db_manager.get_histories_for_users(db, user_ids, limit=100)
+        
+        # Warm the token cache for every user in one encode_batch call
+        self._count_contents([message.get("content", "") for history in histories.values() for message in history])
+        
+        stats = {}
+        for user_id in user_ids:
+            history = histories.get(user_id)
+            if not history:
+                stats[user_id] = {"total_messages": 0, "total_tokens": 0, "needs_summary": False}
+            else:
+                stats[user_id] = self._build_conversation_stats(history, self.count_tokens(history))
+        return stats
+    
+    def _build_conversation_stats(self, conversation_history: List[Dict[str, str]], total_tokens: int) -> Dict:
+        """Build the statistics dict for a non-empty history"""
         return {
             "total_messages": len(conversation_history),
             "total_tokens": total_tokens,
@@ -274,7 +435,7 @@ class ConversationSummarizationService:
             "token_efficiency": f"{((self.summary_trigger_tokens - total_tokens) / self.summary_trigger_tokens * 100):.1f}%" if total_tokens <= self.summary_trigger_tokens else "Needs optimization"
         }
     
-    def force_create_summary(self, db: Session, user_id: int, language: str = None) -> Dict:
+    async def force_create_summary(self, db: Session, user_id: int, language: str = None) -> Dict:
         """Force create a summary for testing or manual optimization"""
         conversation_history = db_manager.get_user_conversation_history(db, user_id, limit=50)
         
@@ -282,10 +443,10 @@ class ConversationSummarizationService:
             return {"error": "No conversation history found"}
         
         if language is None:
-            language = self._detect_conversation_language(conversation_history)
+            language = await self._detect_conversation_language(conversation_history)
         
         # Create summary
-        summary = self.create_conversation_summary(conversation_history, language)
+        summary = await self.create_conversation_summary(conversation_history, language)
         
         # Calculate token savings
         original_tokens = self.count_tokens(conversation_history)
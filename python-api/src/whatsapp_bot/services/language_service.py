@@ -1,18 +1,36 @@
-from typing import Optional
-from whatsapp_bot.openai_client import OpenAIClient
+import os
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Session
+from whatsapp_bot.openai_client import get_openai_client
+from whatsapp_bot.database import db_manager, redis_cache
 from whatsapp_bot.config import config_manager
 from whatsapp_bot.utils.logging_config import get_logger
 
 logger = get_logger(__name__)
 
+# Messages shorter than this reuse the user's last known language instead of re-detecting
+SHORT_MESSAGE_LENGTH = 40
+
+# Languages assumed supported when the prompts directory cannot be read
+FALLBACK_LANGUAGES = ('english', 'romanian')
+
 class LanguageDetectionService:
     """Service for detecting and managing message languages"""
     
     def __init__(self):
-        self.client = OpenAIClient()
+        self._client = None
         self.config_manager = config_manager
+        # (prompts_dir, mtime_ns, languages) from the last prompts directory scan
+        self._supported_cache: Optional[Tuple[str, int, Tuple[str, ...]]] = None
+    
+    @property
+    def client(self):
+        """Shared OpenAI client, looked up on first detection"""
+        if self._client is None:
+            self._client = get_openai_client()
+        return self._client
     
-    def detect_language(self, text: str) -> str:
+    async def detect_language(self, text: str) -> str:
         """
         Detect the language of the input text
         
@@ -24,18 +42,19 @@ class LanguageDetectionService:
         """
         language_config = self.config_manager.get_language_config()
         
-        # If language detection is disabled, return default language
-        if not language_config.detection_enabled:
-            logger.debug(f"Language detection disabled, using default: {language_config.default_language}")
+        # Skip detection for very short texts (likely not informative enough);
+        # the raw length is checked first so most short messages never get stripped
+        if len(text) < 10 or len(text.strip()) < 10:
+            logger.debug("Text too short for reliable detection, using default: %s", language_config.default_language)
             return language_config.default_language
         
-        # Skip detection for very short texts (likely not informative enough)
-        if len(text.strip()) < 10:
-            logger.debug(f"Text too short for reliable detection, using default: {language_config.default_language}")
+        # If language detection is disabled, return default language
+        if not language_config.detection_enabled:
+            logger.debug("Language detection disabled, using default: %s", language_config.default_language)
             return language_config.default_language
         
         try:
-            detected_language = self.client.detect_language(text)
+            detected_language = await self.client.detect_language(text)
             logger.info(f"Language detected: {detected_language}")
             return detected_language
             
@@ -43,50 +62,111 @@ class LanguageDetectionService:
             logger.error(f"Error in language detection: {str(e)}")
             return language_config.default_language
     
-    def get_language_for_conversation(self, text: str, user_id: Optional[int] = None) -> str:
+    async def detect_batch(self, texts: List[str]) -> List[str]:
+        """
+        Detect the language of several texts at once
+        
+        Applies the same rules as detect_language, but texts that need a
+        model are detected together in one batch.
+        
+        Args:
+            texts: Texts to analyze
+            
+        Returns:
+            Detected language codes, in the same order as the texts
+        """
+        language_config = self.config_manager.get_language_config()
+        default_language = language_config.default_language
+        if not language_config.detection_enabled:
+            return [default_language] * len(texts)
+        
+        detected = [default_language] * len(texts)
+        # Short texts keep the default, as in detect_language
+        to_detect = [i for i, text in enumerate(texts) if len(text) >= 10 and len(text.strip()) >= 10]
+        if not to_detect:
+            return detected
+        
+        try:
+            results = await self.client.detect_languages([texts[i] for i in to_detect])
+        except Exception as e:
+            logger.error(f"Error in batch language detection: {str(e)}")
+            return detected
+        
+        for i, language in zip(to_detect, results):
+            detected[i] = language
+        return detected
+    
+    async def get_language_for_conversation(self, text: str, user_id: Optional[int] = None,
+                                            db: Optional[Session] = None) -> str:
         """
         Get the appropriate language for a conversation
         
+        Short messages from returning users reuse their last known language
+        instead of running detection again.
+        
         Args:
             text: Current message text
-            user_id: Optional user ID for future language preference storage
+            user_id: Optional user ID used to look up and remember the user's language
+            db: Optional database session for looking up the last interaction language
             
         Returns:
             Language code to use for the response
         """
-        # For now, detect language from current message
-        # In future, could implement user language preference storage
-        detected_language = self.detect_language(text)
+        detected_language = None
         
-        # Additional validation - ensure we have prompts for this language
-        supported_languages = self._get_supported_languages()
+        if user_id is not None and len(text) < SHORT_MESSAGE_LENGTH and self.is_language_detection_enabled():
+            detected_language = self._get_known_language(user_id, db)
+            if detected_language:
+                logger.debug(f"Reusing known language for user {user_id}: {detected_language}")
+        
+        if not detected_language:
+            detected_language = await self.detect_language(text)
         
-        if detected_language not in supported_languages:
+        # Additional validation - ensure we have prompts for this language
+        if not self._is_supported_language(detected_language):
             logger.warning(f"Language {detected_language} not supported, falling back to default")
-            return self.config_manager.get_language_config().default_language
+            detected_language = self.config_manager.get_language_config().default_language
+        
+        if user_id is not None:
+            try:
+                redis_cache.cache_user_language(user_id, detected_language)
+            except Exception as e:
+                logger.warning(f"Error caching language for user {user_id}: {str(e)}")
         
         return detected_language
     
+    def _get_known_language(self, user_id: int, db: Optional[Session]) -> Optional[str]:
+        """Get the user's last known language from Redis, falling back to their latest interaction"""
+        try:
+            language = redis_cache.get_user_language(user_id)
+            if language:
+                return language
+        except Exception as e:
+            logger.warning(f"Error reading cached language for user {user_id}: {str(e)}")
+        
+        if db is None:
+            return None
+        
+        try:
+            return db_manager.get_last_interaction_language(db, user_id)
+        except Exception as e:
+            logger.warning(f"Error loading last language for user {user_id}: {str(e)}")
+            return None
+    
     def _get_supported_languages(self) -> list:
         """
         Get list of supported languages based on available prompt files
         
+        The prompts directory is only rescanned when its mtime changes.
+        
         Returns:
             List of supported language codes
         """
-        import os
-        from pathlib import Path
-        
         # Check what prompt files are available
         prompts_dir = os.getenv("PROMPTS_DIR", "prompts")
-        supported_languages = []
         
         try:
-            if os.path.exists(prompts_dir):
-                for file in os.listdir(prompts_dir):
-                    if file.endswith('.txt') and not file.startswith('summary_'):
-                        language = file.replace('.txt', '')
-                        supported_languages.append(language)
+            supported_languages = list(self._scan_prompt_languages(prompts_dir))
             
             # Ensure default language is always supported
             default_lang = self.config_manager.get_language_config().default_language
@@ -96,11 +176,40 @@ class LanguageDetectionService:
         except Exception as e:
             logger.error(f"Error checking supported languages: {str(e)}")
             # Fallback to common languages
-            supported_languages = ['english', 'romanian']
+            supported_languages = list(FALLBACK_LANGUAGES)
         
         logger.debug(f"Supported languages: {supported_languages}")
         return supported_languages
     
+    def _is_supported_language(self, language: str) -> bool:
+        """Check whether a language has prompts (or is the default) without building the full list"""
+        if language == self.config_manager.get_language_config().default_language:
+            return True
+        
+        try:
+            return language in self._scan_prompt_languages(os.getenv("PROMPTS_DIR", "prompts"))
+        except Exception as e:
+            logger.error(f"Error checking supported languages: {str(e)}")
+            return language in FALLBACK_LANGUAGES
+    
+    def _scan_prompt_languages(self, prompts_dir: str) -> Tuple[str, ...]:
+        """List languages with a system prompt file, reusing the last scan while the directory is unchanged"""
+        try:
+            mtime = os.stat(prompts_dir).st_mtime_ns
+        except FileNotFoundError:
+            return ()
+        
+        cached = self._supported_cache
+        if cached is not None and cached[0] == prompts_dir and cached[1] == mtime:
+            return cached[2]
+        
+        languages = tuple(
+            file[:-len('.txt')] for file in os.listdir(prompts_dir)
+            if file.endswith('.txt') and not file.startswith('summary_')
+        )
+        self._supported_cache = (prompts_dir, mtime, languages)
+        return languages
+    
     def is_language_detection_enabled(self) -> bool:
         """Check if language detection is enabled"""
         return self.config_manager.get_language_config().detection_enabled
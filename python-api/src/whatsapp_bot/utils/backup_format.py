@@ -0,0 +1,26 @@
+"""
+Backup file format detection shared by the backup service and restore scripts.
+"""
+
+from pathlib import Path
+from typing import Union
+
+# pg_dump custom-format (-Fc) archives start with this signature
+CUSTOM_FORMAT_MAGIC = b"PGDMP"
+
+
+def is_custom_format_dump(backup_file: Union[str, Path]) -> bool:
+    """
+    Check whether a backup is a pg_dump custom-format archive (restored with pg_restore)
+    
+    Args:
+        backup_file: Path to the backup file
+        
+    Returns:
+        True for custom-format archives, False for plain SQL (or unreadable) files
+    """
+    try:
+        with open(backup_file, "rb") as f:
+            return f.read(len(CUSTOM_FORMAT_MAGIC)) == CUSTOM_FORMAT_MAGIC
+    except OSError:
+        return False
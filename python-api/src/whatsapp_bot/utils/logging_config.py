@@ -1,22 +1,77 @@
+import atexit
 import logging
 import logging.config
 import os
+import queue
 import sys
-from typing import Dict, Any
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+# Background thread that performs the file writes for all loggers
+_queue_listener: Optional[QueueListener] = None
+
+# (log_level, logs_dir) of the applied configuration, so repeated setup calls are no-ops
+_configured: Optional[Tuple[str, str]] = None
+
+
+def _stop_queue_listener() -> None:
+    """Flush queued records and stop the background file writer"""
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+
+def _move_file_handlers_to_queue(logger_names: Iterable[str]) -> None:
+    """
+    Replace the loggers' file handlers with a queue drained by a background thread
+    
+    Logging calls then only enqueue the record; formatting for and writing to
+    the rotating log files happens on the listener thread.
+    
+    Args:
+        logger_names: Loggers to rewire ("" for the root logger)
+    """
+    global _queue_listener
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    file_handlers = []
+    
+    for name in logger_names:
+        logger = logging.getLogger(name)
+        handlers = [handler for handler in logger.handlers if isinstance(handler, RotatingFileHandler)]
+        if not handlers:
+            continue
+        for handler in handlers:
+            logger.removeHandler(handler)
+            if handler not in file_handlers:
+                file_handlers.append(handler)
+        logger.addHandler(queue_handler)
+    
+    # Each file handler keeps its own level (errors.log only receives errors)
+    _queue_listener = QueueListener(log_queue, *file_handlers, respect_handler_level=True)
+    _queue_listener.start()
+
+
+atexit.register(_stop_queue_listener)
 
 
 def setup_logging(log_level: str = "INFO") -> None:
     """
     Configure logging for the WhatsApp OpenAI Bot application.
     
+    Calling it again with the same level and working directory does nothing.
+    
     Args:
         log_level: The logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
     """
+    global _configured
+    logs_dir = os.path.join(os.getcwd(), "logs")
+    if _configured == (log_level, logs_dir):
+        return
     
     # Create logs directory if it doesn't exist
-    logs_dir = os.path.join(os.getcwd(), "logs")
-    if not os.path.exists(logs_dir):
-        os.makedirs(logs_dir)
+    os.makedirs(logs_dir, exist_ok=True)
     
     # Logging configuration
     logging_config: Dict[str, Any] = {
@@ -94,8 +149,11 @@ def setup_logging(log_level: str = "INFO") -> None:
         }
     }
     
-    # Apply the logging configuration
+    # Apply the logging configuration (stopping any previous writer before its handlers are closed)
+    _stop_queue_listener()
     logging.config.dictConfig(logging_config)
+    _move_file_handlers_to_queue([*logging_config["loggers"], ""])
+    _configured = (log_level, logs_dir)
     
     # Get the main logger
     logger = logging.getLogger("whatsapp_bot")
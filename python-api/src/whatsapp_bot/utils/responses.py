@@ -0,0 +1,51 @@
+"""
+JSON response helpers backed by orjson.
+"""
+
+import hashlib
+from typing import Any, Optional
+
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+# Config data changes rarely, so polling clients and proxies may reuse it briefly
+CONFIG_CACHE_CONTROL = "max-age=30, stale-while-revalidate=60"
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse that renders content with orjson (handles datetimes natively)"""
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def compute_etag(body: bytes) -> str:
+    """Compute a strong ETag (quoted content hash) for a response body"""
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_response(request: Request, body: bytes, etag: Optional[str] = None,
+                  cache_control: str = CONFIG_CACHE_CONTROL) -> Response:
+    """
+    Return a JSON body with ETag/Cache-Control headers, or 304 if the client already has it
+    
+    Args:
+        request: Incoming request (checked for If-None-Match)
+        body: Serialized JSON body
+        etag: Precomputed ETag for body (computed here if omitted)
+        cache_control: Cache-Control header value
+        
+    Returns:
+        A 304 Not Modified response or the full JSON response
+    """
+    etag = etag or compute_etag(body)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in candidates or "*" in candidates:
+            return Response(status_code=304, headers=headers)
+    
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -3,22 +3,26 @@
 Test script for anti-ban enable/disable functionality
 """
 
-import requests
+import asyncio
+import httpx
 import time
 import json
+import statistics
 
 # API base URL
 BASE_URL = "http://localhost:8000"
 
-def send_admin_command(phone: str, command: str):
+# Maximum number of chat requests in flight at once
+MAX_CONCURRENCY = 5
+
+async def send_admin_command(client: httpx.AsyncClient, phone: str, command: str):
     """Send an admin command"""
-    url = f"{BASE_URL}/chat"
     payload = {
         "phone": phone,
         "message": command
     }
     
-    response = requests.post(url, json=payload)
+    response = await client.post("/chat", json=payload)
     
     if response.status_code == 200:
         data = response.json()
@@ -28,17 +32,18 @@ def send_admin_command(phone: str, command: str):
     
     return response
 
-def test_chat_message(phone: str, message: str):
+async def test_chat_message(client: httpx.AsyncClient, phone: str, message: str,
+                            semaphore: asyncio.Semaphore = None):
     """Send a regular chat message and measure response time"""
-    url = f"{BASE_URL}/chat"
     payload = {
         "phone": phone,
         "message": message
     }
     
-    start_time = time.time()
-    response = requests.post(url, json=payload)
-    end_time = time.time()
+    async with semaphore or asyncio.Semaphore(1):
+        start_time = time.perf_counter()
+        response = await client.post("/chat", json=payload)
+        end_time = time.perf_counter()
     
     response_time = end_time - start_time
     
@@ -55,11 +60,25 @@ def test_chat_message(phone: str, message: str):
     print("-" * 50)
     return response, response_time
 
-def get_anti_ban_stats():
+async def run_chat_batch(client: httpx.AsyncClient, phone: str, label: str, count: int = 3):
+    """Send a batch of chat messages concurrently and return their response times"""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    results = await asyncio.gather(*[
+        test_chat_message(client, phone, f"Test message {i+1} with {label}", semaphore)
+        for i in range(count)
+    ])
+    return [response_time for _, response_time in results]
+
+def summarize_times(label: str, times: list):
+    """Print p50/p95 response times for a batch"""
+    p50 = statistics.median(times)
+    p95 = statistics.quantiles(times, n=20, method="inclusive")[-1] if len(times) > 1 else times[0]
+    print(f"Response time with {label}: p50 {p50:.2f}s, p95 {p95:.2f}s")
+    return p50
+
+async def get_anti_ban_stats(client: httpx.AsyncClient):
     """Get current anti-ban statistics"""
-    url = f"{BASE_URL}/anti-ban/stats"
-    
-    response = requests.get(url)
+    response = await client.get("/anti-ban/stats")
     
     if response.status_code == 200:
         data = response.json()
@@ -68,7 +87,7 @@ def get_anti_ban_stats():
     else:
         print(f"❌ Error getting stats: {response.status_code} - {response.text}")
 
-def main():
+async def main():
     """Test anti-ban enable/disable functionality"""
     print("🛡️  Anti-Ban Toggle Testing")
     print("=" * 50)
@@ -76,63 +95,52 @@ def main():
     admin_phone = "+1234567890"  # Assuming this is an admin number
     test_phone = "+9876543210"
     
-    print("📊 Current Configuration:")
-    send_admin_command(admin_phone, "/config")
-    print()
-    
-    print("🛡️ Current Anti-Ban Status:")
-    send_admin_command(admin_phone, "/config antiban")
-    print()
-    
-    print("1️⃣ Testing with Anti-Ban ENABLED:")
-    send_admin_command(admin_phone, "/config antiban on")
-    
-    # Test response times with anti-ban enabled
-    print("\nTesting response times with anti-ban enabled:")
-    times_enabled = []
-    for i in range(3):
-        _, response_time = test_chat_message(test_phone, f"Test message {i+1} with anti-ban enabled")
-        times_enabled.append(response_time)
-        time.sleep(1)
-    
-    avg_time_enabled = sum(times_enabled) / len(times_enabled)
-    print(f"Average response time with anti-ban enabled: {avg_time_enabled:.2f}s")
-    print()
-    
-    print("2️⃣ Testing with Anti-Ban DISABLED:")
-    send_admin_command(admin_phone, "/config antiban off")
-    
-    # Test response times with anti-ban disabled
-    print("\nTesting response times with anti-ban disabled:")
-    times_disabled = []
-    for i in range(3):
-        _, response_time = test_chat_message(test_phone, f"Test message {i+1} with anti-ban disabled")
-        times_disabled.append(response_time)
-        time.sleep(0.5)  # Shorter delay since anti-ban is disabled
-    
-    avg_time_disabled = sum(times_disabled) / len(times_disabled)
-    print(f"Average response time with anti-ban disabled: {avg_time_disabled:.2f}s")
-    print()
-    
-    print("📈 Comparison:")
-    print(f"Average response time (anti-ban enabled):  {avg_time_enabled:.2f}s")
-    print(f"Average response time (anti-ban disabled): {avg_time_disabled:.2f}s")
-    print(f"Time difference: {abs(avg_time_enabled - avg_time_disabled):.2f}s")
-    print()
-    
-    print("3️⃣ Testing Spam Detection:")
-    print("With anti-ban enabled:")
-    send_admin_command(admin_phone, "/config antiban on")
-    test_chat_message(test_phone, "BUY NOW! Limited time offer! Click this link!")
-    
-    print("With anti-ban disabled:")
-    send_admin_command(admin_phone, "/config antiban off")
-    test_chat_message(test_phone, "BUY NOW! Limited time offer! Click this link!")
-    
-    print("4️⃣ Final Statistics:")
-    get_anti_ban_stats()
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=30) as client:
+        print("📊 Current Configuration:")
+        await send_admin_command(client, admin_phone, "/config")
+        print()
+        
+        print("🛡️ Current Anti-Ban Status:")
+        await send_admin_command(client, admin_phone, "/config antiban")
+        print()
+        
+        print("1️⃣ Testing with Anti-Ban ENABLED:")
+        await send_admin_command(client, admin_phone, "/config antiban on")
+        
+        # Test response times with anti-ban enabled
+        print("\nTesting response times with anti-ban enabled:")
+        times_enabled = await run_chat_batch(client, test_phone, "anti-ban enabled")
+        p50_enabled = summarize_times("anti-ban enabled", times_enabled)
+        print()
+        
+        print("2️⃣ Testing with Anti-Ban DISABLED:")
+        await send_admin_command(client, admin_phone, "/config antiban off")
+        
+        # Test response times with anti-ban disabled
+        print("\nTesting response times with anti-ban disabled:")
+        times_disabled = await run_chat_batch(client, test_phone, "anti-ban disabled")
+        p50_disabled = summarize_times("anti-ban disabled", times_disabled)
+        print()
+        
+        print("📈 Comparison:")
+        print(f"Median response time (anti-ban enabled):  {p50_enabled:.2f}s")
+        print(f"Median response time (anti-ban disabled): {p50_disabled:.2f}s")
+        print(f"Time difference: {abs(p50_enabled - p50_disabled):.2f}s")
+        print()
+        
+        print("3️⃣ Testing Spam Detection:")
+        print("With anti-ban enabled:")
+        await send_admin_command(client, admin_phone, "/config antiban on")
+        await test_chat_message(client, test_phone, "BUY NOW! Limited time offer! Click this link!")
+        
+        print("With anti-ban disabled:")
+        await send_admin_command(client, admin_phone, "/config antiban off")
+        await test_chat_message(client, test_phone, "BUY NOW! Limited time offer! Click this link!")
+        
+        print("4️⃣ Final Statistics:")
+        await get_anti_ban_stats(client)
     
     print("✅ Anti-ban toggle testing completed!")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
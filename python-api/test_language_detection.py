@@ -5,6 +5,7 @@ Test script for language detection functionality
 
 import os
 import sys
+import asyncio
 from pathlib import Path
 
 # Add the src directory to Python path
@@ -14,7 +15,7 @@ sys.path.insert(0, str(src_path))
 from whatsapp_bot.services.language_service import LanguageDetectionService
 from whatsapp_bot.config import config_manager
 
-def test_language_detection():
+async def test_language_detection():
     """Test the language detection service"""
     print("🧪 Testing Language Detection Service")
     print("=" * 50)
@@ -41,19 +42,29 @@ def test_language_detection():
     
     # Test each message
     for message, expected_lang in test_messages:
-        print(f"Testing: '{message}'")
-        detected_lang = language_service.get_language_for_conversation(message)
+        detected_lang = await language_service.get_language_for_conversation(message)
         status = "✅" if detected_lang == expected_lang else "❌"
-        print(f"  Expected: {expected_lang}")
-        print(f"  Detected: {detected_lang} {status}")
-        print()
+        # One write per message, still printed as each result arrives
+        print(
+            f"Testing: '{message}'\n"
+            f"  Expected: {expected_lang}\n"
+            f"  Detected: {detected_lang} {status}\n"
+        )
+    
+    # Detect all test messages in one batch
+    detected_batch = await language_service.detect_batch([message for message, _ in test_messages])
+    correct = sum(
+        detected == expected for detected, (_, expected) in zip(detected_batch, test_messages)
+    )
+    print(f"Batch detection: {correct}/{len(test_messages)} as expected")
+    print()
     
     # Test with language detection disabled
     print("Testing with language detection disabled...")
     config_manager.update_language_config(detection_enabled=False)
     
     test_message = "Salut, cum te mai duci?"
-    detected_lang = language_service.get_language_for_conversation(test_message)
+    detected_lang = await language_service.get_language_for_conversation(test_message)
     expected_default = config_manager.get_language_config().default_language
     
     print(f"Message: '{test_message}'")
@@ -72,12 +83,11 @@ def test_language_detection():
     # Test supported languages check
     print("\nSupported Languages:")
     supported_langs = language_service._get_supported_languages()
-    for lang in supported_langs:
-        print(f"  - {lang}")
+    print("\n".join(f"  - {lang}" for lang in supported_langs))
 
 if __name__ == "__main__":
     try:
-        test_language_detection()
+        asyncio.run(test_language_detection())
     except Exception as e:
         print(f"❌ Test failed with error: {e}")
         import traceback
@@ -3,14 +3,21 @@
 Test script for configuration management functionality
 """
 
-import requests
-import json
+import httpx
+import orjson
 import time
 from datetime import datetime
 
 # API base URL
 BASE_URL = "http://localhost:8000"
 
+# One keep-alive client for every call, so requests reuse the connection
+SESSION = httpx.Client(timeout=30, limits=httpx.Limits(max_keepalive_connections=5))
+
+def print_items(data: dict):
+    """Print a dict as bullet lines in one write"""
+    print("\n".join(f"  • {key}: {value}" for key, value in data.items()))
+
 def test_config_endpoints():
     """Test configuration management endpoints"""
     print("🔧 Testing Configuration Management")
@@ -18,11 +25,11 @@ def test_config_endpoints():
     
     # Test getting current config
     print("📋 Getting current configuration...")
-    response = requests.get(f"{BASE_URL}/config")
+    response = SESSION.get(f"{BASE_URL}/config")
     if response.status_code == 200:
-        config = response.json()
+        config = orjson.loads(response.content)
         print("✅ Current configuration:")
-        print(json.dumps(config, indent=2))
+        print(orjson.dumps(config, option=orjson.OPT_INDENT_2).decode())
     else:
         print(f"❌ Error getting config: {response.status_code}")
     
@@ -30,12 +37,11 @@ def test_config_endpoints():
     
     # Test config summary
     print("📊 Getting configuration summary...")
-    response = requests.get(f"{BASE_URL}/config/summary")
+    response = SESSION.get(f"{BASE_URL}/config/summary")
     if response.status_code == 200:
         summary = response.json()
         print("✅ Configuration summary:")
-        for key, value in summary.items():
-            print(f"  • {key}: {value}")
+        print_items(summary)
     else:
         print(f"❌ Error getting summary: {response.status_code}")
     
@@ -48,11 +54,11 @@ def test_response_config():
     
     # Test updating response length
     print("🔧 Setting response length to 500 tokens...")
-    response = requests.put(f"{BASE_URL}/config/response", json={
+    response = SESSION.put(f"{BASE_URL}/config/response", json={
         "max_tokens": 500,
         "response_style": "brief"
     })
-    if response.status_code == 200:
+    if response.status_code == 202:
         print("✅ Response configuration updated")
         print(f"Response: {response.json()}")
     else:
@@ -60,7 +66,7 @@ def test_response_config():
     
     # Test invalid values
     print("🚫 Testing invalid token count...")
-    response = requests.put(f"{BASE_URL}/config/response", json={
+    response = SESSION.put(f"{BASE_URL}/config/response", json={
         "max_tokens": 5000  # Too high
     })
     if response.status_code == 400:
@@ -79,29 +85,28 @@ def test_access_control():
     
     # Add to allowed numbers
     print(f"➕ Adding {test_phone} to allowed numbers...")
-    response = requests.post(f"{BASE_URL}/config/numbers/allow/{test_phone}")
-    if response.status_code == 200:
+    response = SESSION.post(f"{BASE_URL}/config/numbers/allow/{test_phone}")
+    if response.status_code == 202:
         print("✅ Number added to allowed list")
     else:
         print(f"❌ Error adding number: {response.status_code}")
     
     # Check number access
     print(f"🔍 Checking access for {test_phone}...")
-    response = requests.get(f"{BASE_URL}/config/numbers/check/{test_phone}")
+    response = SESSION.get(f"{BASE_URL}/config/numbers/check/{test_phone}")
     if response.status_code == 200:
         access_info = response.json()
         print("✅ Access check result:")
-        for key, value in access_info.items():
-            print(f"  • {key}: {value}")
+        print_items(access_info)
     else:
         print(f"❌ Error checking access: {response.status_code}")
     
     # Test whitelist mode
     print("🔒 Enabling whitelist mode...")
-    response = requests.put(f"{BASE_URL}/config/access", json={
+    response = SESSION.put(f"{BASE_URL}/config/access", json={
         "whitelist_mode": True
     })
-    if response.status_code == 200:
+    if response.status_code == 202:
         print("✅ Whitelist mode enabled")
     else:
         print(f"❌ Error enabling whitelist: {response.status_code}")
@@ -115,11 +120,11 @@ def test_maintenance_mode():
     
     # Enable maintenance mode
     print("🚧 Enabling maintenance mode...")
-    response = requests.post(f"{BASE_URL}/config/maintenance", params={
+    response = SESSION.post(f"{BASE_URL}/config/maintenance", params={
         "enabled": True,
         "message": "Bot is under maintenance for testing"
     })
-    if response.status_code == 200:
+    if response.status_code == 202:
         print("✅ Maintenance mode enabled")
         print(f"Response: {response.json()}")
     else:
@@ -127,7 +132,7 @@ def test_maintenance_mode():
     
     # Test chat during maintenance
     print("💬 Testing chat during maintenance...")
-    response = requests.post(f"{BASE_URL}/chat", json={
+    response = SESSION.post(f"{BASE_URL}/chat", json={
         "phone": "+1234567890",
         "message": "Hello during maintenance"
     })
@@ -139,10 +144,10 @@ def test_maintenance_mode():
     
     # Disable maintenance mode
     print("✅ Disabling maintenance mode...")
-    response = requests.post(f"{BASE_URL}/config/maintenance", params={
+    response = SESSION.post(f"{BASE_URL}/config/maintenance", params={
         "enabled": False
     })
-    if response.status_code == 200:
+    if response.status_code == 202:
         print("✅ Maintenance mode disabled")
     else:
         print(f"❌ Error disabling maintenance: {response.status_code}")
@@ -159,8 +164,8 @@ def test_admin_numbers():
     
     # Test adding admin number via API
     print(f"➕ Adding {test_admin_phone} to admin numbers via API...")
-    response = requests.post(f"{BASE_URL}/config/numbers/admin/{test_admin_phone}")
-    if response.status_code == 200:
+    response = SESSION.post(f"{BASE_URL}/config/numbers/admin/{test_admin_phone}")
+    if response.status_code == 202:
         print("✅ Admin number added via API")
         print(f"Response: {response.json()}")
     else:
@@ -168,18 +173,17 @@ def test_admin_numbers():
     
     # Check admin status
     print(f"🔍 Checking admin status for {test_admin_phone}...")
-    response = requests.get(f"{BASE_URL}/config/numbers/check/{test_admin_phone}")
+    response = SESSION.get(f"{BASE_URL}/config/numbers/check/{test_admin_phone}")
     if response.status_code == 200:
         access_info = response.json()
         print("✅ Admin check result:")
-        for key, value in access_info.items():
-            print(f"  • {key}: {value}")
+        print_items(access_info)
     else:
         print(f"❌ Error checking admin status: {response.status_code}")
     
     # Test admin command via chat (using existing admin)
     print(f"👑 Testing /admin command via chat...")
-    response = requests.post(f"{BASE_URL}/chat", json={
+    response = SESSION.post(f"{BASE_URL}/chat", json={
         "phone": existing_admin,
         "message": f"/admin +5555555555"
     })
@@ -191,7 +195,7 @@ def test_admin_numbers():
     
     # Test unadmin command via chat
     print(f"👤 Testing /unadmin command via chat...")
-    response = requests.post(f"{BASE_URL}/chat", json={
+    response = SESSION.post(f"{BASE_URL}/chat", json={
         "phone": existing_admin,
         "message": f"/unadmin +5555555555"
     })
@@ -203,8 +207,8 @@ def test_admin_numbers():
     
     # Remove admin number via API
     print(f"➖ Removing {test_admin_phone} from admin numbers via API...")
-    response = requests.delete(f"{BASE_URL}/config/numbers/admin/{test_admin_phone}")
-    if response.status_code == 200:
+    response = SESSION.delete(f"{BASE_URL}/config/numbers/admin/{test_admin_phone}")
+    if response.status_code == 202:
         print("✅ Admin number removed via API")
         print(f"Response: {response.json()}")
     else:
@@ -221,7 +225,7 @@ def test_admin_commands():
     
     # Test help command
     print("❓ Testing /help command...")
-    response = requests.post(f"{BASE_URL}/chat", json={
+    response = SESSION.post(f"{BASE_URL}/chat", json={
         "phone": admin_phone,
         "message": "/help"
     })
@@ -234,7 +238,7 @@ def test_admin_commands():
     
     # Test config command
     print("⚙️ Testing /config command...")
-    response = requests.post(f"{BASE_URL}/chat", json={
+    response = SESSION.post(f"{BASE_URL}/chat", json={
         "phone": admin_phone,
         "message": "/config"
     })
@@ -247,7 +251,7 @@ def test_admin_commands():
     
     # Test token setting
     print("📝 Testing /config tokens command...")
-    response = requests.post(f"{BASE_URL}/chat", json={
+    response = SESSION.post(f"{BASE_URL}/chat", json={
         "phone": admin_phone,
         "message": "/config tokens 800"
     })
@@ -273,13 +277,13 @@ def test_response_styles():
         print(f"🔧 Setting style to {style}...")
         
         # Update style
-        requests.put(f"{BASE_URL}/config/response", json={
+        SESSION.put(f"{BASE_URL}/config/response", json={
             "response_style": style
         })
         
         # Test response
         print(f"💬 Testing {style} response...")
-        response = requests.post(f"{BASE_URL}/chat", json={
+        response = SESSION.post(f"{BASE_URL}/chat", json={
             "phone": test_phone,
             "message": test_message
         })
@@ -291,7 +295,7 @@ def test_response_styles():
         else:
             print(f"❌ Error with {style} style: {response.status_code}")
         
-        time.sleep(2)  # Respect rate limits
+        time.sleep(2)  # Stay past the global rate limit between chat messages
     
     print("-" * 30)
 
@@ -332,15 +336,15 @@ def main():
     finally:
         # Reset to defaults
         print("🔄 Resetting to default configuration...")
-        requests.put(f"{BASE_URL}/config/response", json={
+        SESSION.put(f"{BASE_URL}/config/response", json={
             "max_tokens": 1000,
             "response_style": "conversational",
             "temperature": 0.8
         })
-        requests.put(f"{BASE_URL}/config/access", json={
+        SESSION.put(f"{BASE_URL}/config/access", json={
             "whitelist_mode": False
         })
-        requests.post(f"{BASE_URL}/config/maintenance", params={
+        SESSION.post(f"{BASE_URL}/config/maintenance", params={
             "enabled": False
         })
         print("✅ Configuration reset to defaults")